@@ -129,9 +129,6 @@ EXTRA_SPECIAL = [
     ("title", "b_vijaya", "mandala_capital_01"),
 ]
 
-load_items()
-
-
 def map_extra_special() -> dict:
     mapping = {}
     for extra in EXTRA_SPECIAL:
@@ -166,9 +163,6 @@ def map_extra_special() -> dict:
     return mapping
 
 
-EXTRA_SPECIAL_MAPPING = map_extra_special()
-
-
 class Title:
     ALL: dict[str, "Title"] = {}
     RANK: dict[str, "Title"] = {
@@ -193,20 +187,30 @@ class Title:
         self.development: list[tuple[CWHistoryDate, int]] = []
         self.children: list[list[Title]] = []
         self.title_history: list[CWHistoryDate] = []
+        self.title_item: CWHistoryTitle = None  # timelines of title_history
         self.culture: list[tuple[CWHistoryDate, CWCulture]] = []
         self.faith: list[tuple[CWHistoryDate, CWFaith]] = []
         self.special: list[tuple[CWHistoryDate, str]] = []
         self.special_slot: list[tuple[CWHistoryDate, str]] = []
         self.province_history: list[CWHistoryDate] = []
+        self.province_item: CWHistoryProvince = None
         self.can_create: CWObject = None
 
     def __repr__(self) -> str:
         return self.name
 
+    @classmethod
+    def serialize(cls, snapshot: CWSnapshot):
+        snapshot.store(cls, ("ALL", "RANK"))
+
+    @classmethod
+    def deserialize(cls, snapshot: CWSnapshot):
+        snapshot.restore(cls, ("ALL", "RANK"))
+
     @classmethod
     def initialize(cls):
         stubdate = CWHistoryDate()
-        stubdate.date = Token("1.1.1")
+        stubdate.date = shared_token("1.1.1")
         stubdate.datenum = 10101
 
         for cwtitle in CWTitle.ALL.values():
@@ -250,9 +254,11 @@ class Title:
                     title.altnames[value].append(namelist)
 
             if title.name in CWHistoryTitle.ALL:
-                title.title_history = CWHistoryTitle.ALL[title.name].dates
+                title.title_item = CWHistoryTitle.ALL[title.name]
+                title.title_history = title.title_item.dates
             if title.province in CWHistoryProvince.ALL:
-                title.province_history = CWHistoryProvince.ALL[title.province].dates
+                title.province_item = CWHistoryProvince.ALL[title.province]
+                title.province_history = title.province_item.dates
 
             title.can_create = cwtitle.can_create
 
@@ -263,25 +269,41 @@ class Title:
         # Only apply to de jure
         # Lower Ranked first
 
-        # Compares two dates, returns the bigger one
-        # matching conditions
+        # Last date up to limit matching conditions, base when it is bigger
+        # dates defined later have priority, see CWTimeline
+        def history_date(
+            title: Title,
+            name: str,
+            base: CWHistoryDate,
+            limit: str,
+            province: bool,
+            match=None,
+        ) -> CWHistoryDate:
+            # None when no date after base matches
+            history = title.province_item if province else title.title_item
+            if history is None:
+                return None
+            return history.timeline(name, match).at(STARTING_DATES[limit], base)
+
         def compare_history(
             field: str, title: Title, base: CWHistoryDate, limit: str, province: bool
         ):
-            comparision_date = base
-            if province:
-                dates = title.province_history
-            else:
-                dates = title.title_history
-            for date in dates:
-                if date.__dict__[field] is None:
-                    continue
-                if date > STARTING_DATES[limit]:
-                    continue
-                if date < comparision_date:
-                    continue  # dates defined later have priority
-                comparision_date = date
-            return comparision_date
+            comparision_date = history_date(title, field, base, limit, province)
+            return base if comparision_date is None else comparision_date
+
+        def set_title_name(date: CWHistoryDate) -> bool:
+            if date.name is not None:
+                return True
+            return date_effect(date) == "set_title_name"
+
+        def set_capital_county(date: CWHistoryDate) -> bool:
+            return date_effect(date) == "set_capital_county"
+
+        def date_effect(date: CWHistoryDate) -> str:
+            # name of the first effect
+            if date.effect is None or type(date.effect[0]) is not CWObject:
+                return None
+            return date.effect[0].name
 
         print("Resolving de jure")
         # Resolve de jures
@@ -372,26 +394,20 @@ class Title:
 
                     # Alternative Name
                     # 'reset_name = yes' can be ignored for the wiki
-                    # Modification from compare_history function
-                    comparision_date = title.altnames_date[-1][0]
-                    datename = None
-                    for date in title.title_history:
-                        if date > STARTING_DATES[starting_date]:
-                            continue
-                        if date < comparision_date:
-                            continue  # dates defined later have priority
-                        if date.name is not None:
-                            comparision_date = date
+                    # name or effect set_title_name
+                    comparision_date = history_date(
+                        title,
+                        "set_title_name",
+                        title.altnames_date[-1][0],
+                        starting_date,
+                        False,
+                        set_title_name,
+                    )
+                    if comparision_date is not None:
+                        if comparision_date.name is not None:
                             datename = comparision_date.name.token
-                        elif date.effect is not None:
-                            if type(date.effect[0]) is not CWObject:
-                                continue
-                            effect = date.effect[0]
-                            if effect.name != "set_title_name":
-                                continue
-                            comparision_date = date
-                            datename = effect.values.token
-                    if datename is not None:
+                        else:
+                            datename = comparision_date.effect[0].values.token
                         title.altnames_date.append(
                             (comparision_date, datename))
                     else:
@@ -399,25 +415,19 @@ class Title:
 
                     # New Capital
                     # effect set_capital_county
-                    comparision_date = title.capital[-1][0]
-                    datecapital = None
-                    for date in title.title_history:
-                        if date > STARTING_DATES[starting_date]:
-                            continue
-                        if date < comparision_date:
-                            continue  # dates defined later have priority
-                        if date.effect is not None:
-                            if type(date.effect[0]) is not CWObject:
-                                continue
-                            effect = date.effect[0]
-                            if effect.name != "set_capital_county":
-                                continue
-                            comparision_date = date
-                            datecapital = effect.values.token
-                            if "title:" in datecapital:
-                                datecapital = datecapital[len("title:"):]
-                            datecapital = cls.ALL[datecapital]
-                    if datecapital is not None:
+                    comparision_date = history_date(
+                        title,
+                        "set_capital_county",
+                        title.capital[-1][0],
+                        starting_date,
+                        False,
+                        set_capital_county,
+                    )
+                    if comparision_date is not None:
+                        datecapital = comparision_date.effect[0].values.token
+                        if "title:" in datecapital:
+                            datecapital = datecapital[len("title:"):]
+                        datecapital = cls.ALL[datecapital]
                         title.capital.append((comparision_date, datecapital))
                     else:
                         title.capital.append(title.capital[-1])
@@ -494,10 +504,6 @@ class Title:
                             title.special[index][0], building)
 
 
-Title.initialize()
-Title.after_initialize()
-
-
 def get_altnames(title: Title) -> str:
     altnames = {}
     for altname in title.altnames:
@@ -918,8 +924,19 @@ def list_of_kingdoms():
     pass
 
 
-list_of_counties()
-list_of_duchies()
-list_of_kingdoms()
+# Worker processes import this module too, they must not load anything
+if __name__ == "__main__":
+    # Start from the last run when the game files did not change
+    SNAPSHOT = CWSnapshot([Title], [__file__], (STARTING_DATES, EXTRA_SPECIAL))
+    if not SNAPSHOT.load(SNAPSHOTPATH):
+        load_items()
+        EXTRA_SPECIAL_MAPPING = map_extra_special()
+        Title.initialize()
+        Title.after_initialize()
+        SNAPSHOT.save(SNAPSHOTPATH)
+
+    list_of_counties()
+    list_of_duchies()
+    list_of_kingdoms()
 
 pass
@@ -1,6 +1,19 @@
+import array
+import bisect
+import codecs
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import marshal
+import mmap
+import os
 import pathlib
 import re
-from typing import Generator
+import sys
+import zipfile
+import zlib
+from typing import Generator, Iterable
 
 CHAR_BOUNDARY = (" ", "\t", "\n", "\r")
 CHAR_OBJ = {"{": "OBJ_START", "}": "OBJ_END"}
@@ -29,145 +42,376 @@ class Token:
     OBJOPEN = "OPEN"
     OBJCLOSE = "CLOSE"
 
-    def __init__(self, token: str, filename: pathlib.Path = None, line: int = 0):
-        self.token = token
-        self.type = None
+    def __init__(
+        self,
+        token: str,
+        filename: pathlib.Path = None,
+        offset: int = -1,
+        end: int = -1,
+        line_index: "LineIndex" = None,
+    ):
+        self.token, self.type = classify_lexeme(token)
         self.filename = filename
-        self.line = line
-        if not self.token.strip():
+        # source[offset:end] is the token, line and column come from line_index
+        self.offset = offset
+        self.end = end
+        self.line_index = line_index
+        if self.type is None:
             self.error("Empty Token")
-
-        if token.lower() in ("yes", "no"):
-            self.type = Token.BOOL
-        elif token in CHAR_OPERATOR:
-            self.type = CHAR_OPERATOR[token]
-            if self.type == "OP_INVALID":
-                self.error("Invalid Token")
-        elif token == "{":
-            self.type = Token.OBJOPEN
-        elif token == "}":
-            self.type = Token.OBJCLOSE
-        elif re.match(r'".+"$', token):
-            self.token = self.token[1:-1]
-            self.type = Token.STRING
-        elif re.match(r"@\[.+\]$", token):
-            self.type = Token.EXPRESSION
-        elif re.match(r"@.+$", token):
-            self.type = Token.LOCAL
-        elif re.match(r"\d+\.\d+\.$", token) or re.match(r"\d+\.\d+\.\d+\.?$", token):
-            # Can be both date or decimal depending on context
-            self.transform_into_date()
-        elif re.match(r"-?\d+\.\d{0,}$", token):
-            if not self.token.split(".")[1]:
-                self.token += "0"
-            self.token = float(self.token)
-            self.type = Token.NUMBER
-        elif re.match(r"-?\d+$", token):
-            self.token = int(self.token)
-            self.type = Token.NUMBER
-        else:
-            self.type = Token.IDENTIFIER
+        elif self.type == "OP_INVALID":
+            self.error("Invalid Token")
 
     def __repr__(self):
         return f"{self.type}:{self.token}"
 
+    @property
+    def line(self) -> int:
+        return self.line_index.line(self.offset) if self.line_index else 0
+
+    @property
+    def column(self) -> int:
+        return self.line_index.column(self.offset) if self.line_index else 0
+
     def error(self, message: str):
         raise Exception(f"{message} | {self.filename}:{self.line} - {self.token}")
 
     def transform_into_date(self):
         self.type = Token.DATE
-        # Try to transform value into date
-        # A     - A.1.1 | A.     - A.1.1 (possible number)
-        # A.B   - A.B.1 | A.B.   - A.1.1 (possible float)
-        # A.B.C - A.B.C | A.B.C. - A.B.C (guaranteed date)
-        # Normalize date
-        values = str(self.token).split(".")
-        # Missing date values default to one
-        values += [1] * (3 - len(values))
-        values[0] = int(values[0]) if values[0] else 1
-        values[1] = int(values[1]) if values[1] else 1
-        values[2] = int(values[2]) if values[2] else 1
-        self.token = ".".join([str(value) for value in values[:3]])
+        self.token = normalize_date(self.token)
+
+
+def normalize_date(value: str | int | float) -> str:
+    # Try to transform value into date
+    # A     - A.1.1 | A.     - A.1.1 (possible number)
+    # A.B   - A.B.1 | A.B.   - A.1.1 (possible float)
+    # A.B.C - A.B.C | A.B.C. - A.B.C (guaranteed date)
+    # Normalize date
+    values = str(value).split(".")
+    # Missing date values default to one
+    values += [1] * (3 - len(values))
+    values[0] = int(values[0]) if values[0] else 1
+    values[1] = int(values[1]) if values[1] else 1
+    values[2] = int(values[2]) if values[2] else 1
+    return ".".join([str(value) for value in values[:3]])
+
+
+# Lexemes repeat endlessly (=, {, }, yes, holding, culture...)
+# so each distinct one is only classified once
+LEXEME_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=LEXEME_CACHE_SIZE)
+def classify_lexeme(token: str) -> tuple[any, str]:
+    # Token.__init__ rules, returns (value, type)
+    # type is None for an empty token and OP_INVALID for ! and ?
+    if not token.strip():
+        return token, None
+    if token.lower() in ("yes", "no"):
+        return token, Token.BOOL
+    elif token in CHAR_OPERATOR:
+        return token, CHAR_OPERATOR[token]
+    elif token == "{":
+        return token, Token.OBJOPEN
+    elif token == "}":
+        return token, Token.OBJCLOSE
+    elif re.match(r'".+"$', token):
+        return token[1:-1], Token.STRING
+    elif re.match(r"@\[.+\]$", token):
+        return token, Token.EXPRESSION
+    elif re.match(r"@.+$", token):
+        return token, Token.LOCAL
+    elif re.match(r"\d+\.\d+\.$", token) or re.match(r"\d+\.\d+\.\d+\.?$", token):
+        # Can be both date or decimal depending on context
+        return normalize_date(token), Token.DATE
+    elif re.match(r"-?\d+\.\d{0,}$", token):
+        if not token.split(".")[1]:
+            token += "0"
+        return float(token), Token.NUMBER
+    elif re.match(r"-?\d+$", token):
+        return int(token), Token.NUMBER
+    return token, Token.IDENTIFIER
+
+
+class SharedToken(Token):
+    # Flyweight for tokens without a position, like defaults and implicit operators
+    # one instance per lexeme is shared by everyone, so it can not be changed
+    def __init__(self, token: str):
+        super().__init__(token)
+        self.frozen = True
+
+    def __setattr__(self, name: str, value):
+        if getattr(self, "frozen", False):
+            self.error(f"Shared Token can not be changed ({name})")
+        super().__setattr__(name, value)
+
+
+SHARED_TOKENS: dict[str, SharedToken] = {}
+
+
+def shared_token(token: str) -> SharedToken:
+    if token not in SHARED_TOKENS:
+        SHARED_TOKENS[token] = SharedToken(token)
+    return SHARED_TOKENS[token]
+
+
+for lexeme, lexeme_type in CHAR_OPERATOR.items():
+    if lexeme_type != "OP_INVALID":
+        shared_token(lexeme)
+TOKEN_EQUAL = shared_token("=")
+TOKEN_OBJOPEN = shared_token("{")
+TOKEN_OBJCLOSE = shared_token("}")
+TOKEN_YES = shared_token("yes")
+TOKEN_NO = shared_token("no")
+
+
+class LineIndex:
+    # Offset where each line starts, built once per file
+    # so tokens only keep an offset and lines are found with bisect
+    NEWLINE_REGEX = re.compile(r"\n")
+    BYTES_NEWLINE_REGEX = re.compile(rb"\r\n?|\n")  # text mode newlines
+    first = 0  # lines before the first start
+
+    def __init__(
+        self,
+        source: str | bytes | mmap.mmap,
+        base: int = 0,
+        line: int = 1,
+        line_start: int = 0,
+    ):
+        # For a piece of a bigger text: base is where source starts,
+        # inside line number line, that starts at line_start
+        if type(source) is str:
+            regex = LineIndex.NEWLINE_REGEX
+        else:
+            regex = LineIndex.BYTES_NEWLINE_REGEX
+        self.first = line - 1
+        self.starts = array.array("Q", [line_start])
+        self.starts.extend(base + match.end() for match in regex.finditer(source))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, offset: int) -> int:
+        return self.first + bisect.bisect_right(self.starts, offset)
+
+    def column(self, offset: int) -> int:
+        return offset - self.starts[bisect.bisect_right(self.starts, offset) - 1] + 1
+
+
+def fingerprint_files(files: list[pathlib.Path]) -> list[tuple]:
+    # (path, size, modification time) of each file, to know they are unchanged
+    fingerprint = []
+    for file in files:
+        stat = file.stat()
+        fingerprint.append((str(file), stat.st_size, stat.st_mtime_ns))
+    return fingerprint
 
 
 def read_file(filename: pathlib.Path | str) -> str:
     # CK3 files are split between UTF-8 with BOM (UTF-8-SIG)
     # and Windows CP-1252 (Windows-1252) for some godforsaken reason
-    # Try one, if it fails use the other
+    # The file is read once, see decode_file
     if type(filename) is str:
         filename = pathlib.Path(filename)
-    try:
-        with filename.open("r", encoding="utf-8-sig") as f:
-            return f.read()
-    except UnicodeDecodeError:
-        with filename.open("r", encoding="windows-1252") as f:
-            return f.read()
+    return decode_file(filename.read_bytes())
+
+
+# Tokenizer engines, "charwise" is the reference implementation
+# "regex" produces the same tokens, but much faster
+TOKENIZE_CHARWISE = "charwise"
+TOKENIZE_REGEX = "regex"
+TOKENIZE_ENGINE = TOKENIZE_CHARWISE
 
 
 # Clausewitz Tokenizer
-def tokenize(text: str, filename: pathlib.Path) -> Generator[Token, any, any]:
-    current_line = 1
+def tokenize(
+    text: str, filename: pathlib.Path, engine: str = None
+) -> Generator[Token, any, any]:
+    engine = engine if engine else TOKENIZE_ENGINE
+    if engine == TOKENIZE_CHARWISE:
+        return tokenize_charwise(text, filename)
+    elif engine == TOKENIZE_REGEX:
+        return tokenize_regex(text, filename)
+    raise Exception(f"Unknown tokenizer engine: {engine}")
+
+
+# Any character that is part of a word in the charwise tokenizer
+CHAR_WORD = r"""[^ \t\n\r{}#"=!?<>@]"""
+# Leading spaces and newlines are consumed with each token, so finditer
+# does not retry every group on whitespace. Plain identifiers and numbers get
+# their own groups, anything unusual falls back to the "word" group
+TOKEN_REGEX = re.compile(
+    r"""[ \t\r\n]*(?:"""
+    r"""(?P<identifier>[A-Za-z_][A-Za-z0-9_.:'\-]*(?!""" + CHAR_WORD + r"""))"""
+    r"""|(?P<operator>[=!?<>]=?)"""
+    r"""|(?P<obj>[{}])"""
+    r"""|(?P<integer>-?[0-9]+(?!""" + CHAR_WORD + r"""))"""
+    r"""|(?P<decimal>-?[0-9]+\.[0-9]*(?!""" + CHAR_WORD + r"""))"""
+    r"""|(?P<word>""" + CHAR_WORD + r"""+|@(?!\[)""" + CHAR_WORD + r"""+)"""
+    r"""|(?P<string>"[^"]*")"""
+    r"""|(?P<expression>@\[[^\]]*\])"""
+    r"""|(?P<comment>\#[^\n]*)"""
+    r"""|(?P<unterminated>"|@\[|@\Z)"""
+    r"""|(?P<at>@)"""
+    r""")"""
+)
+
+# TOKEN_REGEX groups that can grow with more text, ex: "a" into "ab" or "=" into "=="
+PARTIAL_KINDS = frozenset(
+    ("identifier", "operator", "integer", "decimal", "word", "comment")
+)
+
+
+def tokenize_regex(
+    text: str,
+    filename: pathlib.Path,
+    line_index: LineIndex = None,
+    base: int = 0,
+    partial: bool = False,
+    pos: int = 0,
+    endpos: int = -1,
+) -> Generator[Token, any, int]:
+    # base is the offset of text in the whole source
+    # partial stops before a token that may continue after the end of text
+    # the generator then returns where that token starts in text
+    # pos and endpos only tokenize text[pos:endpos], like re.finditer
+    line_index = line_index if line_index else LineIndex(text)
+    new_token = Token.__new__
+    endpos = len(text) if endpos < 0 else endpos
+
+    for match in TOKEN_REGEX.finditer(text, pos, endpos):
+        kind = match.lastgroup
+        value = match[kind]
+        start = match.start(kind)
+        end = start + len(value)
+        if partial and (
+            kind == "unterminated" or (end == endpos and kind in PARTIAL_KINDS)
+        ):
+            return start
+        start += base
+        end += base
+        if kind == "identifier":
+            if len(value) < 4 and value.lower() in ("yes", "no"):
+                token_type = Token.BOOL
+            else:
+                token_type = Token.IDENTIFIER
+        elif kind == "operator":
+            token_type = CHAR_OPERATOR[value]
+            if token_type == "OP_INVALID":
+                yield Token(value, filename, start, end, line_index)  # raises
+        elif kind == "obj":
+            token_type = Token.OBJOPEN if value == "{" else Token.OBJCLOSE
+        elif kind == "integer":
+            value = int(value)
+            token_type = Token.NUMBER
+        elif kind == "decimal":
+            value = float(value + "0" if value[-1] == "." else value)
+            token_type = Token.NUMBER
+        elif kind == "word":
+            # charwise strips words, which also removes unicode spaces
+            word = value.strip()
+            if not word:
+                continue
+            if len(word) != len(value):
+                start += len(value) - len(value.lstrip())
+                end = start + len(word)
+            value, token_type = classify_lexeme(word)
+        elif kind == "comment":
+            continue
+        elif kind == "unterminated":
+            if value == "@" and match.end() < len(text):
+                # @\Z matched at endpos, the text goes on: a lone @
+                yield Token(value, filename, start, end, line_index)
+                continue
+            raise Exception(
+                f"Unterminated Token | {filename}:{line_index.line(start)}"
+            )
+        else:
+            # strings, expressions and lone @, rare cases handled by Token
+            yield Token(value, filename, start, end, line_index)
+            continue
+
+        token = new_token(Token)
+        token.token = value
+        token.type = token_type
+        token.filename = filename
+        token.offset = start
+        token.end = end
+        token.line_index = line_index
+        yield token
+    return endpos
+
+
+def tokenize_charwise(
+    text: str, filename: pathlib.Path
+) -> Generator[Token, any, any]:
+    line_index = LineIndex(text)
     start = index = 0
 
+    def word_token(start: int, end: int) -> Token:
+        # words are stripped, None when only spaces are left
+        word = text[start:end]
+        stripped = word.strip()
+        if stripped:
+            start += len(word) - len(word.lstrip())
+            return Token(stripped, filename, start, start + len(stripped), line_index)
+
     while True:
         character = text[index] if index < len(text) else " "
         if character in CHAR_BOUNDARY:
-            word = "".join(text[start:index]).strip()
-            if word:
-                yield Token(word, filename, current_line)
+            token = word_token(start, index)
+            if token:
+                yield token
             index += 1
             start = index
-            if character == "\n":
-                current_line += 1
             if index > len(text):
                 break
         elif character in CHAR_OBJ:
-            word = "".join(text[start:index]).strip()
-            if word:
-                yield Token(word, filename, current_line)
-            yield Token(character, filename, current_line)
+            token = word_token(start, index)
+            if token:
+                yield token
+            yield Token(character, filename, index, index + 1, line_index)
             index += 1
             start = index
         elif character == "#":
-            word = "".join(text[start:index]).strip()
+            token = word_token(start, index)
             start = index
-            if word:
-                yield Token(word, filename, current_line)
+            if token:
+                yield token
             while (index < len(text)) and (text[index] != "\n"):
                 index += 1
                 start = index  # ignore until newline
-            current_line += 1
             continue
         elif character == '"':
-            word = "".join(text[start:index]).strip()
+            token = word_token(start, index)
             start = index
-            if word:
-                yield Token(word, filename, current_line)
+            if token:
+                yield token
             index += 1
             while text[index] != '"':  # triggers exception on purpose
                 index += 1
             index += 1
             word = "".join(text[start:index])
+            yield Token(word, filename, start, index, line_index)
             start = index
-            yield Token(word, filename, current_line)
         elif character in CHAR_OPERATOR:
-            word = "".join(text[start:index]).strip()
+            token = word_token(start, index)
             start = index
-            if word:
-                yield Token(word, filename, current_line)
+            if token:
+                yield token
             while index < len(text):
                 word = "".join(text[start : index + 1])
                 if word not in CHAR_OPERATOR:  # multi-len operator
                     word = "".join(text[start:index])
+                    yield Token(word, filename, start, index, line_index)
                     start = index
-                    yield Token(word, filename, current_line)
                     break
                 index += 1
         elif character == "@":
-            word = "".join(text[start:index]).strip()
+            token = word_token(start, index)
             start = index
-            if word:
-                yield Token(word, filename, current_line)
+            if token:
+                yield token
             if index == len(text) or text[index + 1] != "[":
                 index += 1
                 continue
@@ -175,35 +419,544 @@ def tokenize(text: str, filename: pathlib.Path) -> Generator[Token, any, any]:
                 index += 1
             index += 1
             word = "".join(text[start:index])
+            yield Token(word, filename, start, index, line_index)
             start = index
-            yield Token(word, filename, current_line)
         else:
             index += 1
 
 
+class TokenStream:
+    # Struct of arrays alternative to a list of Token
+    # one small int per type, values are stored once and referenced by slot
+    # Tokens are only created when asked for
+    IDENTIFIER = 0
+    LOCAL = 1
+    EXPRESSION = 2
+    STRING = 3
+    NUMBER = 4
+    DATE = 5
+    BOOL = 6
+    OBJOPEN = 7
+    OBJCLOSE = 8
+    OP_EQUAL = 9
+    OP_EQUALEQUAL = 10
+    OP_DIFFERENT = 11
+    OP_NULLEQUAL = 12
+    OP_BIGGERTHAN = 13
+    OP_BIGGEREQUAL = 14
+    OP_SMALLERTHAN = 15
+    OP_SMALLEREQUAL = 16
+
+    # code -> Token type
+    TYPES = [
+        Token.IDENTIFIER,
+        Token.LOCAL,
+        Token.EXPRESSION,
+        Token.STRING,
+        Token.NUMBER,
+        Token.DATE,
+        Token.BOOL,
+        Token.OBJOPEN,
+        Token.OBJCLOSE,
+        "OP_EQUAL",
+        "OP_EQUALEQUAL",
+        "OP_DIFFERENT",
+        "OP_NULLEQUAL",
+        "OP_BIGGERTHAN",
+        "OP_BIGGEREQUAL",
+        "OP_SMALLERTHAN",
+        "OP_SMALLEREQUAL",
+    ]
+    CODES = {token_type: code for code, token_type in enumerate(TYPES)}
+    OPERATORS = frozenset(range(OP_EQUAL, OP_SMALLEREQUAL + 1))
+    VALUES = frozenset(range(IDENTIFIER, BOOL + 1)) - {EXPRESSION}
+
+    def __init__(self, filename: pathlib.Path = None, line_index: LineIndex = None):
+        self.filename = filename
+        self.line_index = line_index
+        self.types = array.array("B")
+        self.slots = array.array("I")
+        self.offsets = array.array("I")
+        self.ends = array.array("I")
+        self.values: list = []
+        # 1 == 1.0, floats get their own slots
+        self.value_slots: dict = {}
+        self.float_slots: dict = {}
+        # (key, operator, value) stream indexes of each parsed CWObject
+        self.objects = array.array("i")
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Token:
+        return self.token(index)
+
+    def __iter__(self) -> Generator[Token, any, any]:
+        for index in range(len(self.types)):
+            yield self.token(index)
+
+    def __repr__(self):
+        return f"TokenStream({self.filename}:{len(self.types)})"
+
+    def append(self, token_type: str, value, offset: int, end: int):
+        slots = self.float_slots if value.__class__ is float else self.value_slots
+        slot = slots.get(value)
+        if slot is None:
+            slot = slots[value] = len(self.values)
+            self.values.append(value)
+        self.types.append(TokenStream.CODES[token_type])
+        self.slots.append(slot)
+        self.offsets.append(offset)
+        self.ends.append(end)
+
+    def finish(self):
+        # slot lookups are only needed while appending
+        self.value_slots = None
+        self.float_slots = None
+
+    def value(self, index: int):
+        return self.values[self.slots[index]]
+
+    def add_object(self, key: int, operator: int, value: int) -> int:
+        self.objects.extend((key, operator, value))
+        return len(self.objects) // 3 - 1
+
+    def token(self, index: int) -> Token:
+        token = Token.__new__(Token)
+        token.token = self.values[self.slots[index]]
+        token.type = TokenStream.TYPES[self.types[index]]
+        token.filename = self.filename
+        token.offset = self.offsets[index]
+        token.end = self.ends[index]
+        token.line_index = self.line_index
+        return token
+
+
+def tokenize_stream(text: str, filename: pathlib.Path) -> TokenStream:
+    # tokenize_regex into a TokenStream, for text that is already decoded
+    # files are tokenized by tokenize_bytes
+    line_index = LineIndex(text)
+    stream = TokenStream(filename, line_index)
+    for token in tokenize_regex(text, filename, line_index):
+        stream.append(token.type, token.token, token.offset, token.end)
+    stream.finish()
+    return stream
+
+
+# Bytes version of TOKEN_REGEX, structural characters are all ASCII
+# so tokens are found without decoding anything
+BYTE_WORD = rb"""[^ \t\n\r{}#"=!?<>@]"""
+BYTES_TOKEN_REGEX = re.compile(
+    rb"""[ \t\r\n]*(?:"""
+    rb"""(?P<identifier>[A-Za-z_][A-Za-z0-9_.:'\-]*(?!""" + BYTE_WORD + rb"""))"""
+    rb"""|(?P<operator>[=!?<>]=?)"""
+    rb"""|(?P<obj>[{}])"""
+    rb"""|(?P<integer>-?[0-9]+(?!""" + BYTE_WORD + rb"""))"""
+    rb"""|(?P<decimal>-?[0-9]+\.[0-9]*(?!""" + BYTE_WORD + rb"""))"""
+    rb"""|(?P<word>""" + BYTE_WORD + rb"""+|@(?!\[)""" + BYTE_WORD + rb"""+)"""
+    rb"""|(?P<string>"[^"]*")"""
+    rb"""|(?P<expression>@\[[^\]]*\])"""
+    rb"""|(?P<comment>\#[^\r\n]*)"""
+    rb"""|(?P<unterminated>"|@\[|@\Z)"""
+    rb"""|(?P<at>@)"""
+    rb""")"""
+)
+NON_ASCII_REGEX = re.compile(rb"[\x80-\xff]+")
+
+
+def detect_encoding(data: bytes | mmap.mmap) -> tuple[str, int]:
+    # UTF-8 when it is valid, else Windows-1252
+    # returns (encoding, offset after the BOM)
+    # ASCII bytes are never part of a multibyte sequence, so checking
+    # each run of non ASCII bytes is the same as decoding the whole file
+    # without a decoded copy of it
+    try:
+        for run in NON_ASCII_REGEX.finditer(data):
+            run[0].decode("utf-8")
+    except UnicodeDecodeError:
+        for run in NON_ASCII_REGEX.finditer(data):
+            run[0].decode("windows-1252")  # fails like read_file would
+        return "windows-1252", 0
+    return "utf-8", len(codecs.BOM_UTF8) if data[:3] == codecs.BOM_UTF8 else 0
+
+
+def decode_file(data: bytes) -> str:
+    # Text of a file from its bytes, decoded once in the encoding
+    # detect_encoding finds. Newlines are the same as in text mode
+    encoding, bom = detect_encoding(data)
+    text = str(memoryview(data)[bom:], encoding)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def tokenize_bytes(data: bytes | mmap.mmap, filename: pathlib.Path) -> TokenStream:
+    # Same as tokenize_regex into a TokenStream, but over the raw bytes of a file
+    # each distinct lexeme is decoded and classified once, offsets are in bytes
+    encoding, bom = detect_encoding(data)
+    line_index = LineIndex(data)
+    line_index.starts[0] = bom
+    stream = TokenStream(filename, line_index)
+    append = stream.append
+    types, slots, values = stream.types, stream.slots, stream.values
+    offsets, ends = stream.offsets, stream.ends
+    # short values are interned by their raw bytes, skipping TokenStream.append
+    raw_slots = {}  # raw bytes -> slot, -1 when only spaces
+    raw_strips = {}  # raw bytes -> (leading, trailing) spaces of stripped words
+    slot_codes = []  # slot -> type code
+
+    for match in BYTES_TOKEN_REGEX.finditer(data, bom):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        start = match.start(kind)
+        if kind == "unterminated":
+            raise Exception(
+                f"Unterminated Token | {filename}:{line_index.line(start)}"
+            )
+        raw = match[kind]
+        end = start + len(raw)
+        if kind == "string" or kind == "expression":
+            # mostly unique and long, interned by value to not keep the raw bytes
+            text = raw.decode(encoding)
+            if "\r" in text:
+                # text mode newlines
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            value, token_type = classify_lexeme(text)
+            append(token_type, value, start, end)
+            if len(slot_codes) < len(values):
+                slot_codes.append(types[-1])
+            continue
+        slot = raw_slots.get(raw)
+        if slot is None:
+            text = raw.decode(encoding)
+            if kind == "word":
+                # charwise strips words, which also removes unicode spaces
+                stripped = text.strip()
+                if stripped and len(stripped) != len(text):
+                    raw_strips[raw] = (
+                        len(text[: len(text) - len(text.lstrip())].encode(encoding)),
+                        len(text[len(text.rstrip()) :].encode(encoding)),
+                    )
+                text = stripped
+            slot = -1
+            if text:
+                value, token_type = classify_lexeme(text)
+                if token_type == "OP_INVALID":
+                    Token(text, filename, start, end, line_index)  # raises
+                slot = len(values)
+                values.append(value)
+                slot_codes.append(TokenStream.CODES[token_type])
+            raw_slots[raw] = slot
+        if slot >= 0:
+            if raw_strips and raw in raw_strips:
+                start += raw_strips[raw][0]
+                end -= raw_strips[raw][1]
+            types.append(slot_codes[slot])
+            slots.append(slot)
+            offsets.append(start)
+            ends.append(end)
+    stream.finish()
+    return stream
+
+
+def tokenize_file(filename: pathlib.Path | str) -> TokenStream:
+    # tokenize_bytes over a memory mapped file, the file is never
+    # read into memory or decoded as a whole
+    if type(filename) is str:
+        filename = pathlib.Path(filename)
+    with filename.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return tokenize_bytes(b"", filename)  # empty files can not be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return tokenize_bytes(data, filename)
+
+
+class ReadAhead:
+    # (filename, read(filename)) for each file, in order
+    # files are read by threads ahead of the one being used, up to AHEAD
+    # files and LIMIT bytes (by file size) not yet taken, always at least one
+    # Reading starts as soon as it is made, not when it is iterated
+    AHEAD = 8
+    LIMIT = 16 << 20
+
+    def __init__(
+        self,
+        filenames: Iterable[pathlib.Path],
+        read=pathlib.Path.read_bytes,
+        executor: concurrent.futures.Executor = None,
+        ahead: int = None,
+        limit: int = None,
+    ):
+        self.filenames = [pathlib.Path(filename) for filename in filenames]
+        self.sizes = [os.stat(filename).st_size for filename in self.filenames]
+        self.read = read
+        self.ahead = ahead if ahead is not None else ReadAhead.AHEAD
+        self.limit = limit if limit is not None else ReadAhead.LIMIT
+        self.owned = executor is None  # shut down once read
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max(1, min(4, self.ahead)))
+        self.executor = executor
+        self.pending: collections.deque[concurrent.futures.Future] = collections.deque()
+        self.submitted = 0  # files given to the executor
+        self.taken = 0  # files given back
+        self.held = 0  # bytes read or being read, not taken yet
+        self.fill()
+
+    def __repr__(self):
+        return (
+            f"ReadAhead({self.taken}/{len(self.filenames)} files, "
+            f"{self.held} bytes held)"
+        )
+
+    def fill(self):
+        while self.submitted < len(self.filenames):
+            size = self.sizes[self.submitted]
+            if self.pending and (
+                len(self.pending) >= self.ahead or self.held + size > self.limit
+            ):
+                break
+            filename = self.filenames[self.submitted]
+            self.pending.append(self.executor.submit(self.read, filename))
+            self.held += size
+            self.submitted += 1
+        if self.owned and self.submitted == len(self.filenames):
+            self.executor.shutdown(wait=False)  # reads already given still run
+
+    def __iter__(self) -> Generator[tuple[pathlib.Path, any], None, None]:
+        while self.pending:
+            result = self.pending.popleft().result()
+            filename = self.filenames[self.taken]
+            self.held -= self.sizes[self.taken]
+            self.taken += 1
+            self.fill()
+            yield filename, result
+
+
+class CWParseCache:
+    # TokenStream of each file under root, saved in path
+    # a file that did not change is read back instead of tokenized
+    # one entry per file, keyed by its relative path, size, mtime and hash
+    VERSION = 1  # change with anything that changes tokenize_bytes results
+    SUFFIX = ".cwcache"
+
+    def __init__(self, path: pathlib.Path | str, root: pathlib.Path | str):
+        self.path = pathlib.Path(path)
+        self.root = pathlib.Path(root)
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"CWParseCache({self.path}, {self.hits} hits, {self.misses} misses)"
+
+    def stamp(self) -> tuple:
+        # entries from other versions or machines are not read
+        return (
+            CWParseCache.VERSION,
+            marshal.version,
+            sys.byteorder,
+            array.array("I").itemsize,
+        )
+
+    def entry(self, filename: pathlib.Path) -> pathlib.Path:
+        relative = filename.relative_to(self.root)
+        return self.path.joinpath(relative.parent, relative.name + CWParseCache.SUFFIX)
+
+    def tokenize(self, filename: pathlib.Path | str, data: bytes = None) -> TokenStream:
+        # tokenize_file, unless the file is already in the cache
+        # data is the content of the file, when it was read already
+        if type(filename) is str:
+            filename = pathlib.Path(filename)
+        if not filename.is_relative_to(self.root):
+            if data is None:
+                return tokenize_file(filename)
+            return tokenize_bytes(data, filename)
+        if data is None:
+            data = filename.read_bytes()
+        stat = filename.stat()
+        key = (
+            self.stamp(),
+            filename.relative_to(self.root).as_posix(),
+            stat.st_size,
+            stat.st_mtime_ns,
+            hashlib.blake2b(data, digest_size=16).digest(),
+        )
+        entry = self.entry(filename)
+        try:
+            with entry.open("rb") as f:
+                if marshal.load(f) == key:
+                    stream = self.load(marshal.load(f), filename)
+                    self.hits += 1
+                    return stream
+        except (OSError, EOFError, ValueError, TypeError):
+            pass  # missing or broken, made again
+        self.misses += 1
+        stream = tokenize_bytes(data, filename)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        temporary = entry.with_name(entry.name + ".tmp")
+        with temporary.open("wb") as f:
+            marshal.dump(key, f)
+            marshal.dump(self.dump(stream), f)
+        os.replace(temporary, entry)  # no half written entries
+        return stream
+
+    @staticmethod
+    def dump(stream: TokenStream) -> tuple:
+        return (
+            stream.types.tobytes(),
+            stream.slots.tobytes(),
+            stream.offsets.tobytes(),
+            stream.ends.tobytes(),
+            stream.values,
+            stream.line_index.starts.tobytes(),
+        )
+
+    @staticmethod
+    def load(entry: tuple, filename: pathlib.Path) -> TokenStream:
+        types, slots, offsets, ends, values, starts = entry
+        line_index = LineIndex.__new__(LineIndex)
+        line_index.starts = array.array("Q")
+        line_index.starts.frombytes(starts)
+        stream = TokenStream(filename, line_index)
+        stream.types.frombytes(types)
+        stream.slots.frombytes(slots)
+        stream.offsets.frombytes(offsets)
+        stream.ends.frombytes(ends)
+        stream.values = values
+        stream.finish()
+        return stream
+
+
+class CWArena:
+    # Numbers the CWObject created while it is the current arena ("with")
+    # and keeps them until release(). The default arena keeps nothing,
+    # so a tree is freed as soon as nobody uses it
+    current: "CWArena" = None
+
+    def __init__(self, keep: bool = True):
+        self.keep = keep
+        self.objects: list[CWObject] = []
+        self.count = 0
+        self.previous: CWArena = None
+
+    def __enter__(self) -> "CWArena":
+        self.previous = CWArena.current
+        CWArena.current = self
+        return self
+
+    def __exit__(self, *exception):
+        CWArena.current = self.previous
+        self.previous = None
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __repr__(self):
+        return f"CWArena({self.count} created, {len(self.objects)} kept)"
+
+    def add(self, cwobject: "CWObject") -> int:
+        if self.keep:
+            self.objects.append(cwobject)
+        self.count += 1
+        return self.count - 1
+
+    def release(self):
+        # Objects still used elsewhere stay alive, the others can be freed
+        self.objects = []
+
+
+CWArena.current = CWArena(keep=False)
+
+
 class CWObject:
-    ALL = []
-    INDEX = 0
+    IMPLICIT_OPERATOR = -2  # from_stream operator for a {}
 
     def __init__(self, token: Token = None, operator: Token = None):
         self.token = token
-        self.index = CWObject.INDEX
+        self.index = CWArena.current.add(self)
         self.name = token.token if token else f"OBJ{self.index}"
         self.operator = operator
         self.values: Token | list[Token | CWObject] = []
-        CWObject.INDEX += 1
-        CWObject.ALL.append(self)
+        self.stream: TokenStream = None  # see from_stream
+        self.stream_index = -1
+        self.key_index: tuple[list, int, dict] = None  # see find
+        self.span: tuple = None  # see parse_lazy
+
+    @classmethod
+    def from_stream(
+        cls, stream: TokenStream, key: int = -1, operator: int = -1, value: int = -1
+    ) -> "CWObject":
+        # token, operator and single values are indexes into the stream
+        # and only become Token when accessed (see __getattr__)
+        cwobject = cls.__new__(cls)
+        cwobject.stream = stream
+        cwobject.stream_index = stream.add_object(key, operator, value)
+        cwobject.index = CWArena.current.add(cwobject)
+        cwobject.name = stream.value(key) if key >= 0 else f"OBJ{cwobject.index}"
+        if value < 0:
+            cwobject.values = []
+        cwobject.key_index = None
+        cwobject.span = None
+        return cwobject
+
+    def __getattr__(self, name: str):
+        # Only called when the attribute is missing, which happens
+        # for stream tokens and lazy bodies that were not materialized yet
+        if name == "values" and self.span is not None:
+            values = parse_lazy(*self.span)
+            self.values = values
+            self.span = None
+            return values
+        if name not in ("token", "operator", "values") or self.stream is None:
+            raise AttributeError(name)
+        stream = self.stream
+        key, operator, value = stream.objects[
+            self.stream_index * 3 : self.stream_index * 3 + 3
+        ]
+        if name == "token":
+            token = stream.token(key) if key >= 0 else None
+        elif name == "operator":
+            if operator == CWObject.IMPLICIT_OPERATOR:
+                token = TOKEN_EQUAL  # a {}
+            else:
+                token = stream.token(operator) if operator >= 0 else None
+        else:
+            token = stream.token(value)
+        setattr(self, name, token)
+        return token
 
     def find(self, name: str) -> list[int]:
         if type(self.values) is Token:
             raise Exception(f"{repr(self)} is single value but find was called")
-        ret = []
-        for index, cwobject in enumerate(self.values):
-            if cwobject.token is None:
-                continue
-            if cwobject.token.token == name:
-                ret.append(index)
-        return ret
+        # key -> indexes, built again when values were replaced or changed size
+        # values and keys changed in place go through __setitem__ and
+        # transform_key_into_date, which reset it like append
+        key_index = self.key_index
+        if (
+            key_index is None
+            or key_index[0] is not self.values
+            or key_index[1] != len(self.values)
+        ):
+            indexes = {}
+            for index, cwobject in enumerate(self.values):
+                if cwobject.token is None:
+                    continue
+                indexes.setdefault(cwobject.token.token, []).append(index)
+            key_index = self.key_index = (self.values, len(self.values), indexes)
+        return list(key_index[2].get(name, ()))
+
+    def sibling(self, cwobject: "CWObject", offset: int = 1) -> "CWObject":
+        # Value next to one of the values, ex: the { } after color = hsv
+        for index, value in enumerate(self.values):
+            if value is cwobject:
+                index += offset
+                if 0 <= index < len(self.values):
+                    return self.values[index]
+                return None
+        raise Exception(f"{repr(cwobject)} is not a value of {repr(self)}")
 
     def get(
         self, name: str, allow_multiple=False, default_value=None, return_value=True
@@ -242,6 +995,10 @@ class CWObject:
     def __getitem__(self, i):
         return self.values[i]
 
+    def __setitem__(self, i, value: "Token | CWObject"):
+        self.values[i] = value
+        self.key_index = None
+
     def describe(self, indent: int = 0) -> str:
         retstr = ""
         if self.token:
@@ -264,6 +1021,12 @@ class CWObject:
 
     def append(self, token: Token):
         self.values.append(token)
+        self.key_index = None
+
+    def transform_key_into_date(self, cwobject: "CWObject"):
+        # A value whose key is a date written as a number, ex: 1066 = { }
+        cwobject.token.transform_into_date()
+        self.key_index = None
 
 
 class UnexpectedToken(Exception):
@@ -280,107 +1043,1022 @@ class QueueNotEmpty(Exception):
         )
 
 
+# Token types handled like parse_group does
+OPERATOR_TYPES = frozenset(CHAR_OPERATOR.values())
+VALUE_TYPES = frozenset(
+    (Token.IDENTIFIER, Token.LOCAL, Token.STRING, Token.NUMBER, Token.DATE, Token.BOOL)
+)
+# Keys matched by CWProjection.DATE
+DATE_TYPES = frozenset((Token.DATE, Token.NUMBER))
+
+
+class CWProjection:
+    # Keys of a block kept by parse_lazy, no CWObject is built for the others
+    # each key maps to the projection of its own block, None keeps all of it
+    # "prefix*" keys match by prefix, ANY matches every key and DATE the
+    # date keys (1066.1.1 = { }), SELF as a value is this same projection
+    # Objects without key go with the object before them, ex: color = hsv { }
+    ANY = "*"
+    DATE = "<date>"
+    SELF = "<self>"
+
+    def __init__(self, keys: dict[str, "CWProjection"]):
+        self.keys = {
+            key: self if value == CWProjection.SELF else value
+            for key, value in keys.items()
+        }
+        self.prefixes = [
+            (key[:-1], value)
+            for key, value in self.keys.items()
+            if key != CWProjection.ANY and key.endswith("*")
+        ]
+
+    def __repr__(self):
+        return f"CWProjection({', '.join(self.keys)})"
+
+    def project(self, name: str, date: bool) -> tuple[bool, "CWProjection"]:
+        # If the key is kept and the projection of its block
+        # date is for DATE and NUMBER keys
+        keys = self.keys
+        if name in keys:
+            return True, keys[name]
+        if date and CWProjection.DATE in keys:
+            return True, keys[CWProjection.DATE]
+        if type(name) is str:
+            for prefix, projection in self.prefixes:
+                if name.startswith(prefix):
+                    return True, projection
+        if CWProjection.ANY in keys:
+            return True, keys[CWProjection.ANY]
+        return False, None
+
+
 # Clausewitz Parser
-def parse_group(
-    tokens: Generator[Token, any, any], parent: CWObject = None
-) -> list[CWObject]:
+def parse_group(tokens: Iterable[Token], parent: CWObject = None) -> list[CWObject]:
+    # Explicit stack instead of one call per brace level
+    # the queue is shared by every open brace, each only uses queue[base:]
+    # with parent the tokens are inside a brace, its closing brace ends the group
     objects: list[CWObject] = []
     queue: list[Token] = []
+    base = 0
+    stack: list[tuple[CWObject, list[CWObject], int]] = []
+    operators = OPERATOR_TYPES
+    values = VALUE_TYPES
 
-    while True:
-        try:
-            token = next(tokens)
-            if len(queue) == 0:
-                if token.type in CHAR_OPERATOR.values():
-                    raise UnexpectedToken(token)
-        except StopIteration:
-            if queue and queue[-1].type != Token.OBJCLOSE:
-                raise QueueNotEmpty(queue)
-            return objects
-
-        if token.type in CHAR_OPERATOR.values():
-            if len(queue) == 0:
+    for token in tokens:
+        token_type = token.type
+        if token_type in values:
+            if len(queue) > base and queue[-1].type in operators:
+                cwobject = CWObject(queue[-2])
+                cwobject.operator = queue[-1]
+                cwobject.values = token
+                objects.append(cwobject)
+                del queue[-2:]
+            else:  # list
+                queue.append(token)
+        elif token_type in operators:
+            if len(queue) == base:
                 raise UnexpectedToken(token)
-            if len(queue) > 1:
+            if len(queue) - base > 1:
                 cwobject = CWObject()
-                for item in queue[:-1]:
-                    cwobject.append(item)
+                cwobject.values = queue[base:-1]
                 objects.append(cwobject)
-                queue = queue[-1:]
+                del queue[base:-1]
             queue.append(token)
-        elif token.type == Token.OBJOPEN:
-            if len(queue) > 0:
-                if queue[-1].type in CHAR_OPERATOR.values():
+        elif token_type == Token.OBJOPEN:
+            if len(queue) > base:
+                if queue[-1].type in operators:
                     # a = {}
                     if queue[-1].type not in (CHAR_OPERATOR["="], CHAR_OPERATOR["?="]):
                         raise UnexpectedToken(token)
                     cwobject = CWObject(queue[-2], queue[-1])
-                    cwobject.values = parse_group(tokens, cwobject)
-                    objects.append(cwobject)
-                    queue = queue[:-2]
+                    del queue[-2:]
                 else:
                     # a {}
-                    cwobject = CWObject(queue[-1], Token("="))
-                    cwobject.values = parse_group(tokens, cwobject)
-                    objects.append(cwobject)
-                    queue = queue[:-1]
+                    cwobject = CWObject(queue[-1], TOKEN_EQUAL)
+                    del queue[-1]
             else:
-                if len(queue) > 1:
-                    cwobject = CWObject()
-                    for item in queue[:-1]:
-                        cwobject.append(item)
-                    queue = queue[-1:]
-                    cwobject = CWObject(queue[-1])
-                else:
-                    cwobject = CWObject()
-                cwobject.values = parse_group(tokens, cwobject)
-                objects.append(cwobject)
-                queue = queue[:-1]
-        elif token.type == Token.OBJCLOSE:
-            if parent is None:
+                cwobject = CWObject()
+            stack.append((cwobject, objects, base))
+            objects = []
+            base = len(queue)
+        elif token_type == Token.OBJCLOSE:
+            if not stack and parent is None:
                 raise UnexpectedToken(token)
-            if len(queue):
+            if len(queue) > base:
                 cwobject = CWObject()
-                for item in queue:
-                    cwobject.append(item)
+                cwobject.values = queue[base:]
                 objects.append(cwobject)
-            return objects
-        elif token.type == Token.EXPRESSION:
-            if len(queue) == 0:
+                del queue[base:]
+            if not stack:
+                return objects
+            cwobject, parent_objects, base = stack.pop()
+            cwobject.values = objects
+            parent_objects.append(cwobject)
+            objects = parent_objects
+        elif token_type == Token.EXPRESSION:
+            if len(queue) == base:
                 raise UnexpectedToken(token)
-            if queue[-1].type in CHAR_OPERATOR.values():
+            if queue[-1].type in operators:
                 cwobject = CWObject(queue[-2])
                 cwobject.operator = queue[-1]
                 cwobject.values = token
                 objects.append(cwobject)
-                queue = queue[:-2]
+                del queue[-2:]
             else:  # list
                 queue.append(token)
-        elif token.type in (
-            Token.IDENTIFIER,
-            Token.LOCAL,
-            Token.STRING,
-            Token.NUMBER,
-            Token.DATE,
-            Token.BOOL,
-        ):
+        else:
+            raise UnexpectedToken(token)
+
+    # Out of tokens, braces left open are closed
+    while True:
+        if len(queue) > base:
+            raise QueueNotEmpty(queue[base:])
+        if not stack:
+            return objects
+        cwobject, parent_objects, base = stack.pop()
+        cwobject.values = objects
+        parent_objects.append(cwobject)
+        objects = parent_objects
+
+
+# Clausewitz Parser for a TokenStream, same rules as parse_group
+# with projection, keys it does not keep are skipped, as are their bodies
+def parse_stream(
+    stream: TokenStream, projection: CWProjection = None
+) -> list[CWObject]:
+    types = stream.types
+    operators = TokenStream.OPERATORS
+    values = TokenStream.VALUES
+    dates = (TokenStream.DATE, TokenStream.NUMBER)
+    objects: list[CWObject] = []
+    queue: list[int] = []
+    base = 0
+    stack: list[tuple[CWObject, list[CWObject], int, CWProjection]] = []
+    keep = True  # if the last object was kept
+    indexes = iter(range(len(types)))
+
+    for index in indexes:
+        code = types[index]
+        if code in values:
+            if len(queue) > base and types[queue[-1]] in operators:
+                if projection is not None:
+                    key = queue[-2]
+                    keep = projection.project(stream.value(key), types[key] in dates)[0]
+                if keep:
+                    cwobject = CWObject.from_stream(stream, queue[-2], queue[-1], index)
+                    objects.append(cwobject)
+                del queue[-2:]
+            else:  # list
+                queue.append(index)
+        elif code in operators:
+            if len(queue) == base:
+                raise UnexpectedToken(stream.token(index))
+            if len(queue) - base > 1:
+                if keep:
+                    cwobject = CWObject.from_stream(stream)
+                    for item in queue[base:-1]:
+                        cwobject.append(stream.token(item))
+                    objects.append(cwobject)
+                del queue[base:-1]
+            queue.append(index)
+        elif code == TokenStream.OBJOPEN:
+            key = operator = -1
+            if len(queue) > base:
+                if types[queue[-1]] in operators:
+                    # a = {}
+                    if types[queue[-1]] not in (
+                        TokenStream.OP_EQUAL,
+                        TokenStream.OP_NULLEQUAL,
+                    ):
+                        raise UnexpectedToken(stream.token(index))
+                    key, operator = queue[-2], queue[-1]
+                    del queue[-2:]
+                else:
+                    # a {}
+                    key, operator = queue[-1], CWObject.IMPLICIT_OPERATOR
+                    del queue[-1]
+            block = None  # projection of the body
+            if projection is not None and key >= 0:
+                keep, block = projection.project(stream.value(key), types[key] in dates)
+            if not keep:
+                # up to the closing brace, or the end for a brace left open
+                depth = 1
+                for index in indexes:
+                    code = types[index]
+                    if code == TokenStream.OBJOPEN:
+                        depth += 1
+                    elif code == TokenStream.OBJCLOSE:
+                        depth -= 1
+                        if not depth:
+                            break
+                continue
+            cwobject = CWObject.from_stream(stream, key, operator)
+            stack.append((cwobject, objects, base, projection))
+            objects = []
+            base = len(queue)
+            projection = block
+        elif code == TokenStream.OBJCLOSE:
+            if not stack:
+                raise UnexpectedToken(stream.token(index))
+            if len(queue) > base:
+                if keep:
+                    cwobject = CWObject.from_stream(stream)
+                    for item in queue[base:]:
+                        cwobject.append(stream.token(item))
+                    objects.append(cwobject)
+                del queue[base:]
+            cwobject, parent_objects, base, projection = stack.pop()
+            cwobject.values = objects
+            parent_objects.append(cwobject)
+            objects = parent_objects
+            keep = True
+        elif code == TokenStream.EXPRESSION:
+            if len(queue) == base:
+                raise UnexpectedToken(stream.token(index))
+            if types[queue[-1]] in operators:
+                if projection is not None:
+                    key = queue[-2]
+                    keep = projection.project(stream.value(key), types[key] in dates)[0]
+                if keep:
+                    cwobject = CWObject.from_stream(stream, queue[-2], queue[-1], index)
+                    objects.append(cwobject)
+                del queue[-2:]
+            else:  # list
+                queue.append(index)
+        else:
+            raise UnexpectedToken(stream.token(index))
+
+    # Out of tokens, braces left open are closed
+    while True:
+        if len(queue) > base:
+            raise QueueNotEmpty([stream.token(item) for item in queue[base:]])
+        if not stack:
+            return objects
+        cwobject, parent_objects, base, projection = stack.pop()
+        cwobject.values = objects
+        parent_objects.append(cwobject)
+        objects = parent_objects
+
+
+def parse_file(
+    filename: pathlib.Path,
+    lazy: bool = False,
+    projection: CWProjection = None,
+    cache: CWParseCache = None,
+    data: bytes = None,
+) -> list[CWObject]:
+    # data is the content of the file, when it was read already
+    # Lazy bodies are parsed from the text, so lazy files are never cached
+    if lazy:
+        text = read_file(filename) if data is None else decode_file(data)
+        return parse_lazy(text, filename, projection=projection)
+    if cache is not None:
+        return parse_stream(cache.tokenize(filename, data), projection)
+    if data is None:
+        return parse_stream(tokenize_file(filename), projection)
+    return parse_stream(tokenize_bytes(data, filename), projection)
+
+
+def tokenize_columns(filename: pathlib.Path, cache: CWParseCache = None) -> tuple:
+    # The TokenStream of a file as CWParseCache.dump columns
+    # a few bytes objects, cheap to send back from another process
+    stream = tokenize_file(filename) if cache is None else cache.tokenize(filename)
+    return CWParseCache.dump(stream)
+
+
+def parse_files(
+    filenames: Iterable[pathlib.Path],
+    lazy: bool = False,
+    projection: CWProjection = None,
+    cache: CWParseCache = None,
+    executor: concurrent.futures.Executor = None,
+) -> Iterable[tuple[pathlib.Path, list[CWObject]]]:
+    # parse_file for each file, in order, as they are iterated
+    # without an executor the files are read ahead of the parsing by threads
+    # with one they are tokenized by its workers, a window of files ahead of
+    # the parsing done here (see ReadAhead). Objects are still made one file
+    # after another, so the arena numbers them the same either way
+    filenames = list(filenames)
+    if executor is None:
+        return (
+            (filename, parse_file(filename, lazy, projection, cache, data))
+            for filename, data in ReadAhead(filenames)
+        )
+    if lazy:
+        # lazy bodies are parsed from the text, workers only send tokens back
+        raise ValueError("parse_files: lazy parsing can not use an executor")
+    tokenized = ReadAhead(
+        filenames,
+        functools.partial(tokenize_columns, cache=cache),
+        executor,
+        ahead=2 * (os.cpu_count() or 1),
+    )
+    return (
+        (filename, parse_stream(CWParseCache.load(columns, filename), projection))
+        for filename, columns in tokenized
+    )
+
+
+def match_brace(text: str, pos: int) -> int:
+    # Offset of the } closing a { that ends at pos, -1 when the text ends first
+    # strings, comments and expressions are matched so their braces are ignored
+    depth = 1
+    for match in SKIP_REGEX.finditer(text, pos):
+        char = match[0]
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if not depth:
+                return match.start()
+        elif match.lastgroup == "partial":
+            return -1  # unterminated, an error once it is parsed
+    return -1
+
+
+def parse_lazy(
+    text: str,
+    filename: pathlib.Path = None,
+    line_index: LineIndex = None,
+    pos: int = 0,
+    endpos: int = -1,
+    projection: CWProjection = None,
+) -> list[CWObject]:
+    # parse_group for text[pos:endpos], but the body of each { } is only
+    # brace matched and kept as a span of text. The span is parsed, the
+    # same way, the first time the object values are used (see __getattr__)
+    # endpos is the offset of the closing brace, -1 for the end of text
+    # with projection, keys it does not keep are skipped, as are their bodies
+    # Errors inside a body are only raised once it is parsed
+    line_index = line_index if line_index else LineIndex(text)
+    objects: list[CWObject] = []
+    queue: list[Token] = []
+    operators = OPERATOR_TYPES
+    values = VALUE_TYPES
+    keep = True  # if the last object was kept
+
+    while pos is not None:
+        tokens = tokenize_regex(text, filename, line_index, pos=pos, endpos=endpos)
+        pos = None
+        for token in tokens:
+            token_type = token.type
+            if token_type in values:
+                if len(queue) and queue[-1].type in operators:
+                    if projection is not None:
+                        key = queue[-2]
+                        keep = projection.project(key.token, key.type in DATE_TYPES)[0]
+                    if keep:
+                        cwobject = CWObject(queue[-2])
+                        cwobject.operator = queue[-1]
+                        cwobject.values = token
+                        objects.append(cwobject)
+                    del queue[-2:]
+                else:  # list
+                    queue.append(token)
+            elif token_type in operators:
+                if len(queue) == 0:
+                    raise UnexpectedToken(token)
+                if len(queue) > 1:
+                    if keep:
+                        cwobject = CWObject()
+                        cwobject.values = queue[:-1]
+                        objects.append(cwobject)
+                    del queue[:-1]
+                queue.append(token)
+            elif token_type == Token.OBJOPEN:
+                if len(queue):
+                    if queue[-1].type in operators:
+                        # a = {}
+                        if queue[-1].type not in (
+                            CHAR_OPERATOR["="],
+                            CHAR_OPERATOR["?="],
+                        ):
+                            raise UnexpectedToken(token)
+                        key, operator = queue[-2], queue[-1]
+                        del queue[-2:]
+                    else:
+                        # a {}
+                        key, operator = queue[-1], TOKEN_EQUAL
+                        del queue[-1]
+                else:
+                    key = operator = None
+                close = match_brace(text, token.end)
+                block = None  # projection of the body
+                if projection is not None and key is not None:
+                    keep, block = projection.project(key.token, key.type in DATE_TYPES)
+                if keep:
+                    cwobject = CWObject(key, operator)
+                    del cwobject.values
+                    cwobject.span = (
+                        text, filename, line_index, token.end, close, block
+                    )
+                    objects.append(cwobject)
+                if close >= 0:
+                    pos = close + 1  # tokenize again after the body
+                break
+            elif token_type == Token.OBJCLOSE:
+                raise UnexpectedToken(token)  # bodies never include their }
+            elif token_type == Token.EXPRESSION:
+                if len(queue) == 0:
+                    raise UnexpectedToken(token)
+                if queue[-1].type in operators:
+                    if projection is not None:
+                        key = queue[-2]
+                        keep = projection.project(key.token, key.type in DATE_TYPES)[0]
+                    if keep:
+                        cwobject = CWObject(queue[-2])
+                        cwobject.operator = queue[-1]
+                        cwobject.values = token
+                        objects.append(cwobject)
+                    del queue[-2:]
+                else:  # list
+                    queue.append(token)
+            else:
+                raise UnexpectedToken(token)
+
+    if len(queue):
+        if endpos < 0:  # out of tokens, like parse_group
+            raise QueueNotEmpty(queue)
+        if keep:
+            cwobject = CWObject()
+            cwobject.values = queue
+            objects.append(cwobject)
+    return objects
+
+
+# Braces, and what can hide them, inside a skipped CWFeedParser section
+SKIP_REGEX = re.compile(r"""[{}]|"[^"]*"|#[^\n]*|@\[[^\]]*\]|(?P<partial>"|@\[|@\Z)""")
+
+
+class CWFeedParser:
+    # Push style parse_group, text or bytes are given in chunks of any size
+    # with feed() and each top level CWObject is returned once it is complete
+    # only the unfinished token and the open braces are kept in memory
+    # with sections, other top level keys are read but no object is built
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(
+        self,
+        filename: pathlib.Path = None,
+        encoding: str = "utf-8-sig",
+        sections: Iterable[str] = None,
+    ):
+        self.filename = filename
+        self.encoding = encoding  # for bytes chunks
+        self.sections = set(sections) if sections is not None else None
+        self.skipping = 0  # brace depth inside a skipped section
+        self.decoder: codecs.IncrementalDecoder = None
+        self.buffer = ""  # text after the last complete token
+        self.base = 0  # offset of buffer in the whole text
+        # line of base and where it starts, tokens get an index of their
+        # buffer only, so lines of text already parsed are not kept
+        self.line = 1
+        self.line_start = 0
+        # parse_group state of each open brace: [cwobject, objects, queue]
+        self.stack: list[list] = [[None, [], []]]
+        self.closed = False
+
+    def feed(self, chunk: str | bytes) -> list[CWObject]:
+        if self.closed:
+            raise Exception(f"Feeding a closed parser | {self.filename}")
+        if type(chunk) is not str:
+            if self.decoder is None:
+                self.decoder = codecs.getincrementaldecoder(self.encoding)()
+            chunk = self.decoder.decode(chunk)
+        return self.parse(chunk, False)
+
+    def close(self) -> list[CWObject]:
+        chunk = self.decoder.decode(b"", True) if self.decoder else ""
+        completed = self.parse(chunk, True)
+        self.closed = True
+        # Like parse_group when the tokens run out, braces left open are closed
+        while not self.skipping:
+            cwobject, objects, queue = self.stack[-1]
+            if queue:
+                raise QueueNotEmpty(queue)
+            if cwobject is None:
+                break
+            self.stack.pop()
+            cwobject.values = objects
+            self.stack[-1][1].append(cwobject)
+        return completed + self.stack[0][1]
+
+    def parse(self, chunk: str, final: bool) -> list[CWObject]:
+        self.buffer += chunk
+        while True:
+            if self.skipping:
+                self.consume(self.skip_section(final))
+                if self.skipping:
+                    break
+            line_index = LineIndex(self.buffer, self.base, self.line, self.line_start)
+            tokens = tokenize_regex(
+                self.buffer, self.filename, line_index, self.base, not final
+            )
+            while True:
+                try:
+                    token = next(tokens)
+                except StopIteration as stop:
+                    # keep the token that may continue in the next chunk
+                    consumed = stop.value
+                    break
+                self.push(token)
+                if self.skipping:
+                    consumed = token.end - self.base
+                    break
+            self.consume(consumed)
+            if not self.skipping:
+                break
+        completed = self.stack[0][1]
+        self.stack[0][1] = []
+        return completed
+
+    def consume(self, length: int):
+        newlines = self.buffer.count("\n", 0, length)
+        if newlines:
+            self.line += newlines
+            self.line_start = self.base + self.buffer.rfind("\n", 0, length) + 1
+        self.buffer = self.buffer[length:]
+        self.base += length
+
+    def skip_section(self, final: bool) -> int:
+        # Braces are counted without tokenizing, returns how much was skipped
+        for match in SKIP_REGEX.finditer(self.buffer):
+            text = match[0]
+            if text == "{":
+                self.skipping += 1
+            elif text == "}":
+                self.skipping -= 1
+                if not self.skipping:
+                    return match.end()
+            elif not final and (
+                match.lastgroup == "partial"
+                or (text[0] == "#" and match.end() == len(self.buffer))
+            ):
+                return match.start()
+        return len(self.buffer)
+
+    def push(self, token: Token):
+        # One step of parse_group
+        token_type = token.type
+        cwobject, objects, queue = self.stack[-1]
+        if token_type in OPERATOR_TYPES:
             if len(queue) == 0:
+                raise UnexpectedToken(token)
+            if len(queue) > 1:
+                listobject = CWObject()
+                for item in queue[:-1]:
+                    listobject.append(item)
+                objects.append(listobject)
+                del queue[:-1]
+            queue.append(token)
+        elif token_type == Token.OBJOPEN:
+            if len(queue) > 0:
+                if queue[-1].type in OPERATOR_TYPES:
+                    # a = {}
+                    if queue[-1].type not in (CHAR_OPERATOR["="], CHAR_OPERATOR["?="]):
+                        raise UnexpectedToken(token)
+                    key, operator = queue[-2], queue[-1]
+                    del queue[-2:]
+                else:
+                    # a {}
+                    key, operator = queue[-1], TOKEN_EQUAL
+                    del queue[-1]
+            else:
+                key = operator = None
+            if self.skip(key):
+                self.skipping = 1
+                return
+            self.stack.append([CWObject(key, operator), [], []])
+        elif token_type == Token.OBJCLOSE:
+            if cwobject is None:
+                raise UnexpectedToken(token)
+            if len(queue):
+                listobject = CWObject()
+                for item in queue:
+                    listobject.append(item)
+                objects.append(listobject)
+            self.stack.pop()
+            cwobject.values = objects
+            self.stack[-1][1].append(cwobject)
+        elif token_type in VALUE_TYPES or token_type == Token.EXPRESSION:
+            if len(queue) == 0:
+                if token_type == Token.EXPRESSION:
+                    raise UnexpectedToken(token)
                 queue.append(token)
-                continue
-            if queue[-1].type in CHAR_OPERATOR.values():
-                cwobject = CWObject(queue[-2])
-                cwobject.operator = queue[-1]
-                cwobject.values = token
-                objects.append(cwobject)
-                queue = queue[:-2]
+            elif queue[-1].type in OPERATOR_TYPES:
+                if self.skip(queue[-2]):
+                    del queue[-2:]
+                    return
+                valueobject = CWObject(queue[-2])
+                valueobject.operator = queue[-1]
+                valueobject.values = token
+                objects.append(valueobject)
+                del queue[-2:]
             else:  # list
                 queue.append(token)
         else:
             raise UnexpectedToken(token)
 
+    def skip(self, key: Token) -> bool:
+        # Only top level objects are skipped
+        if self.sections is None or len(self.stack) > 1:
+            return False
+        return key is None or key.token not in self.sections
+
+
+def parse_chunks(
+    chunks: Iterable[str | bytes],
+    filename: pathlib.Path = None,
+    sections: Iterable[str] = None,
+) -> Generator[CWObject, any, any]:
+    # Top level objects of a source that arrives in pieces, as they complete
+    parser = CWFeedParser(filename, sections=sections)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def parse_file_chunks(
+    filename: pathlib.Path | str, chunk_size: int = CWFeedParser.CHUNK_SIZE
+) -> Generator[CWObject, any, any]:
+    # parse_file for files too big to hold in memory, always UTF-8
+    if type(filename) is str:
+        filename = pathlib.Path(filename)
+    with filename.open("rb") as f:
+        yield from parse_chunks(iter(lambda: f.read(chunk_size), b""), filename)
+
+
+SAVE_HEADER = b"SAV"  # first line of a save, SAV + version and sizes
+SAVE_GAMESTATE = "gamestate"
+
+
+def read_save_chunks(f, chunk_size: int) -> Generator[bytes, any, any]:
+    # Chunks of a save's text, without the header line
+    chunk = f.read(chunk_size)
+    if chunk.startswith(SAVE_HEADER):
+        header_end = chunk.find(b"\n")
+        while header_end < 0:  # only possible with tiny chunks
+            chunk += f.read(chunk_size)
+            header_end = chunk.find(b"\n")
+        chunk = chunk[header_end + 1 :]
+    while chunk:
+        yield chunk
+        chunk = f.read(chunk_size)
+
+
+def parse_save(
+    filename: pathlib.Path | str,
+    sections: Iterable[str] = None,
+    chunk_size: int = CWFeedParser.CHUNK_SIZE,
+) -> Generator[CWObject, any, any]:
+    # Top level sections of a plain text save game, one at a time
+    # ex: living, dead_unprunable, landed_titles, provinces
+    # Saves are either the text itself or a header followed by a zip
+    # with a gamestate member, which is decompressed while it is parsed
+    # Sections not asked for are read but their objects are never built
+    if type(filename) is str:
+        filename = pathlib.Path(filename)
+    if zipfile.is_zipfile(filename):
+        with zipfile.ZipFile(filename) as archive:
+            with archive.open(SAVE_GAMESTATE) as f:
+                chunks = read_save_chunks(f, chunk_size)
+                yield from parse_chunks(chunks, filename, sections)
+    else:
+        with filename.open("rb") as f:
+            chunks = read_save_chunks(f, chunk_size)
+            yield from parse_chunks(chunks, filename, sections)
+
+
+# A line with a value in the bytes of a yml file, up to its first quote
+YML_BYTES_REGEX = re.compile(rb'(?:^|(?<=[\r\n]))([^"\r\n#]*)"')
+LINE_END_REGEX = re.compile(rb"[^\r\n]*")
+
+
+class CWLocIndex:
+    # Name -> file and byte offset of its line, for yml files
+    # values are read from the file when looked up, only the index is kept:
+    # a stable hash of each name and its position, sorted by hash
+    # The first line of a name is kept, build prints the others
+    VERSION = 1
+    SUFFIX = ".locindex"
+    OFFSET_BITS = 40  # position = file number << OFFSET_BITS | offset
+
+    def __init__(self):
+        self.files: list[str] = []
+        self.encodings: list[str] = []
+        self.hashes = array.array("Q")
+        self.positions = array.array("Q")
+
+    def __repr__(self):
+        return f"CWLocIndex({len(self.files)} files, {len(self.hashes)} names)"
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @staticmethod
+    def hash(name: str) -> int:
+        # stable between runs, unlike hash(), names are checked when read
+        data = name.encode()
+        return zlib.crc32(data) << 32 | zlib.adler32(data)
+
+    @staticmethod
+    def open(
+        files: list[pathlib.Path], path: pathlib.Path = None, store: "CWLocStore" = None
+    ) -> "CWLocIndex":
+        # build, or load the index saved in path while the files are the same
+        stamp = (CWLocIndex.VERSION, fingerprint_files(files))
+        if path is not None:
+            try:
+                entry = marshal.loads(path.read_bytes())
+                if entry[0] == stamp:
+                    return CWLocIndex.load(entry[1])
+            except (OSError, EOFError, ValueError, TypeError):
+                pass  # missing or broken, made again
+        index = CWLocIndex.build(files, store)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = path.with_name(path.name + ".tmp")
+            temporary.write_bytes(marshal.dumps((stamp, index.dump())))
+            os.replace(temporary, path)
+        return index
+
+    @staticmethod
+    def build(files: list[pathlib.Path], store: "CWLocStore" = None) -> "CWLocIndex":
+        # names already in store are duplicates, store lookups find them first
+        index = CWLocIndex()
+        names: dict[str, int] = {}
+        # ids of other languages have no value in store
+        if store is not None:
+            values = store.languages[CWLocStore.LANGUAGE].values
+        for number, file in enumerate(files):
+            data = file.read_bytes()
+            encoding, bom = detect_encoding(data)
+            index.files.append(str(file))
+            index.encodings.append(encoding)
+            base = number << CWLocIndex.OFFSET_BITS
+            view = memoryview(data)[bom:]  # no line start before the BOM
+            for match in YML_BYTES_REGEX.finditer(view):
+                before = match[1]
+                colon = before.find(b":")
+                if colon == -1:
+                    # the : is after the quote, see parse_yml
+                    line = LINE_END_REGEX.match(view, match.start())[0]
+                    name = parse_yml(line.decode(encoding))[0][0]
+                else:
+                    name = before[:colon].decode(encoding).strip()
+                id = None if store is None else dict.get(store, name)
+                if name in names or id is not None and values[id] is not None:
+                    print(f"Duplicate Loc: {name}")
+                    continue
+                names[name] = base | (bom + match.start())
+        # hash and position in one int, sorted by hash
+        hash_name = CWLocIndex.hash
+        entries = sorted(
+            [hash_name(name) << 64 | position for name, position in names.items()]
+        )
+        mask = (1 << 64) - 1
+        index.hashes.extend([entry >> 64 for entry in entries])
+        index.positions.extend([entry & mask for entry in entries])
+        if store is not None:
+            for other in store.indexes:
+                # only names with the same hash can be in both
+                for key in set(other.hashes).intersection(index.hashes):
+                    for position in index.find(key):
+                        name = index.read(position)[0]
+                        if other.lookup(name) is not None:
+                            print(f"Duplicate Loc: {name}")
+        return index
+
+    def dump(self) -> tuple:
+        return (
+            self.files,
+            self.encodings,
+            self.hashes.tobytes(),
+            self.positions.tobytes(),
+        )
+
+    @staticmethod
+    def load(entry: tuple) -> "CWLocIndex":
+        index = CWLocIndex()
+        index.files, index.encodings, hashes, positions = entry
+        index.hashes.frombytes(hashes)
+        index.positions.frombytes(positions)
+        return index
+
+    def read(self, position: int) -> tuple[str, str]:
+        # (name, value) of the line at a position
+        number = position >> CWLocIndex.OFFSET_BITS
+        with open(self.files[number], "rb") as f:
+            f.seek(position & ((1 << CWLocIndex.OFFSET_BITS) - 1))
+            line = LINE_END_REGEX.match(f.readline())[0]
+        return parse_yml(line.decode(self.encodings[number]))[0]
+
+    def find(self, key: int) -> list[int]:
+        # positions of the names with a hash
+        start = bisect.bisect_left(self.hashes, key)
+        end = bisect.bisect_right(self.hashes, key, start)
+        return self.positions[start:end].tolist()
+
+    def lookup(self, name: str) -> str:
+        # value of a name, None when it is not in the files
+        for position in self.find(CWLocIndex.hash(name)):
+            found, value = self.read(position)
+            if found == name:
+                return value
+        return None
+
+
+class CWLocColumn:
+    # Values of one language, column[id] for the name id of CWLocStore
+    # str until looked up and made into a CWLoc, None when not in the language
+    # Names in indexes are read from their files when looked up, the last
+    # CWLocStore.CACHE_SIZE of them are kept
+    def __init__(self, size: int = 0):
+        self.values: list[str | "CWLoc" | None] = [None] * size
+        self.indexes: list[CWLocIndex] = []
+        self.cache: collections.OrderedDict[str, "CWLoc"] = collections.OrderedDict()
+
+    def __repr__(self):
+        return f"CWLocColumn({len(self.values)} values, {len(self.indexes)} indexes)"
+
+
+class CWLocStore(dict):
+    # name -> id, each name is kept once for every language, their values are
+    # in one CWLocColumn per language, see lookup
+    # Values are added for LANGUAGE, other languages are read the first time
+    # they are looked up from the same files in their localization directory
+    # Iterating goes over the names of every language, not the indexed ones
+    LANGUAGE = "english"
+    CACHE_SIZE = 4096
+
+    def __init__(self):
+        super().__init__()
+        self.languages: dict[str, CWLocColumn] = {CWLocStore.LANGUAGE: CWLocColumn()}
+        # files added, in order: (files, index path), path is None when not indexed
+        self.sources: list[tuple[list[str], str | None]] = []
+
+    @property
+    def indexes(self) -> list[CWLocIndex]:
+        return self.languages[CWLocStore.LANGUAGE].indexes
+
+    def __getitem__(self, name: str) -> "CWLoc":
+        return self.lookup(name)
+
+    def __setitem__(self, name: str, cwloc: "CWLoc"):
+        column = self.languages[CWLocStore.LANGUAGE]
+        column.values[self.intern(name)] = cwloc
+
+    def __contains__(self, name: str) -> bool:
+        return self.contains(name)
+
+    def intern(self, name: str) -> int:
+        # id of a name, new names get one in every column
+        id = dict.get(self, name)
+        if id is None:
+            id = len(self)
+            dict.__setitem__(self, name, id)
+            for column in self.languages.values():
+                column.values.append(None)
+        return id
+
+    def column(self, language: str) -> CWLocColumn:
+        column = self.languages.get(language)
+        if column is None:
+            column = self.load_language(language)
+        return column
+
+    def lookup(self, name: str, language: str = LANGUAGE) -> "CWLoc":
+        column = self.column(language)
+        id = dict.get(self, name)
+        cwloc = None if id is None else column.values[id]
+        if cwloc is None:
+            return self.indexed(name, column)
+        if type(cwloc) is str:
+            cwloc = column.values[id] = CWLoc.make(name, cwloc)
+        return cwloc
+
+    def contains(self, name: str, language: str = LANGUAGE) -> bool:
+        column = self.column(language)
+        id = dict.get(self, name)
+        if id is not None and column.values[id] is not None or name in column.cache:
+            return True
+        return any(index.lookup(name) is not None for index in column.indexes)
+
+    def indexed(self, name: str, column: CWLocColumn) -> "CWLoc":
+        cwloc = column.cache.get(name)
+        if cwloc is not None:
+            column.cache.move_to_end(name)
+            return cwloc
+        for index in column.indexes:
+            value = index.lookup(name)
+            if value is not None:
+                break
+        else:
+            raise KeyError(name)
+        cwloc = column.cache[name] = CWLoc.make(name, value)
+        if len(column.cache) > CWLocStore.CACHE_SIZE:
+            column.cache.popitem(last=False)
+        return cwloc
+
+    def get(self, name: str, default=None, language: str = LANGUAGE) -> "CWLoc":
+        try:
+            return self.lookup(name, language)
+        except KeyError:
+            return default
+
+    def values(self) -> list["CWLoc"]:
+        return [self[name] for name, _ in self.items()]
+
+    def items(self) -> list[tuple[str, "CWLoc"]]:
+        # of LANGUAGE, names only in other languages are skipped
+        values = self.languages[CWLocStore.LANGUAGE].values
+        return [
+            (name, self[name])
+            for name, id in dict.items(self)
+            if values[id] is not None
+        ]
+
+    def clear(self):
+        super().clear()
+        self.languages = {CWLocStore.LANGUAGE: CWLocColumn()}
+        self.sources.clear()
+
+    def add(
+        self,
+        pairs: list[tuple[str, str]],
+        files: list[pathlib.Path] = (),
+        language: str = LANGUAGE,
+    ):
+        # The first value of a name is kept, like CWLoc.register
+        # files are where pairs were read, to read other languages later
+        if files and language == CWLocStore.LANGUAGE:
+            self.sources.append(([str(file) for file in files], None))
+        column = self.languages[language]
+        entries = dict(pairs)
+        if (
+            len(self.languages) == 1
+            and not column.indexes
+            and len(entries) == len(pairs)
+            and self.keys().isdisjoint(entries)
+        ):
+            # new ids in order, at the end of the only column
+            dict.update(self, zip(entries, range(len(self), len(self) + len(entries))))
+            column.values.extend(entries.values())
+            return
+        for name, value in pairs:
+            if self.contains(name, language):
+                if language == CWLocStore.LANGUAGE:
+                    print(f"Duplicate Loc: {name}")
+                continue
+            column.values[self.intern(name)] = value
+
+    def add_index(
+        self, index: CWLocIndex, path: pathlib.Path = None, language: str = LANGUAGE
+    ):
+        # after the entries already added, like reading its files now
+        # path is where the index is saved, see CWLocIndex.open
+        if language == CWLocStore.LANGUAGE:
+            self.sources.append((index.files, None if path is None else str(path)))
+        self.languages[language].indexes.append(index)
+
+    @staticmethod
+    def localized(file: str, language: str) -> pathlib.Path:
+        # the same file in another language, None when it has no language
+        # localization/english/dlc/ep1_l_english.yml -> french/dlc/ep1_l_french.yml
+        path = pathlib.Path(file)
+        directories = list(path.parts[:-1])
+        if CWLocStore.LANGUAGE not in directories:
+            return None
+        last = len(directories) - 1 - directories[::-1].index(CWLocStore.LANGUAGE)
+        directories[last] = language
+        name = path.name.replace(f"_l_{CWLocStore.LANGUAGE}", f"_l_{language}")
+        return pathlib.Path(*directories, name)
+
+    def load_language(self, language: str) -> CWLocColumn:
+        # read from the sources of LANGUAGE, only a column of values is added
+        # missing files are skipped, their names are not in the language
+        column = self.languages[language] = CWLocColumn(len(self))
+        for files, path in self.sources:
+            files = [CWLocStore.localized(file, language) for file in files]
+            files = [file for file in files if file is not None and file.is_file()]
+            if path is None:
+                for file in files:
+                    self.add(parse_yml(read_file(file)), language=language)
+                continue
+            # saved next to the index of LANGUAGE
+            path = pathlib.Path(path)
+            path = path.with_name(f"{path.stem}.{language}{path.suffix}")
+            self.add_index(CWLocIndex.open(files, path), language=language)
+        return column
+
+
+LOC_LINK_REGEX = re.compile(r"\$(.*?)\$")
+
 
 class CWLoc:
-    ALL: list[str, "CWLoc"] = {}
+    ALL: CWLocStore = CWLocStore()
+    linked = False  # links already replaced, see link_loc
     # words with no localization entry, skip them
     LOC_LINK_IGNORE = ["NAME", "TIER", "BASE_NAME", "VALUE"]
 
@@ -393,62 +2071,108 @@ class CWLoc:
         # but when they are, ignore comments after them
         if self.value.rfind('"') != -1:
             self.value = self.value[: self.value.rindex('"')]
-        if self.name in CWLoc.ALL:
-            print(f"Duplicate Loc: {self.name}")
-            return
-            # raise Exception(f"Duplicate Loc: {self.name}")
-        CWLoc.ALL[self.name] = self
+        CWLoc.register(self)
 
     @staticmethod
-    def link_loc(key: str):
-        # name: "$loc1$ $loc2$"
-        search = re.findall(r"\$.*?\$", CWLoc.ALL[key].value)
-        if len(search) == 0:
+    def register(cwloc: "CWLoc"):
+        if cwloc.name in CWLoc.ALL:
+            print(f"Duplicate Loc: {cwloc.name}")
             return
-        newtext = CWLoc.ALL[key].value
-        for link in search:
-            oldtext = link[1:-1].split("|")
-            if oldtext[0] in CWLoc.LOC_LINK_IGNORE:
+            # raise Exception(f"Duplicate Loc: {cwloc.name}")
+        CWLoc.ALL[cwloc.name] = cwloc
+
+    @staticmethod
+    def make(name: str, value: str) -> "CWLoc":
+        # value is already without quotes, see parse_yml
+        cwloc = CWLoc.__new__(CWLoc)
+        cwloc.name = name
+        cwloc.value = value
+        return cwloc
+
+    @staticmethod
+    def from_pair(name: str, value: str) -> "CWLoc":
+        cwloc = CWLoc.make(name, value)
+        CWLoc.register(cwloc)
+        return cwloc
+
+    @staticmethod
+    def segments(value: str) -> list[str | tuple[str, str]]:
+        # text and (name, format) links of a value, ignored links are text
+        # name: "$loc1$ $loc2$" or "$VAL|L$"
+        segments = []
+        start = 0
+        for link in LOC_LINK_REGEX.finditer(value):
+            names = link[1].split("|")
+            if names[0] in CWLoc.LOC_LINK_IGNORE:
+                continue
+            if len(names) > 2:
+                raise Exception(f"linking argument parsing error: {value}")
+            segments.append(value[start : link.start()])
+            segments.append((names[0], names[1] if len(names) == 2 else None))
+            start = link.end()
+        segments.append(value[start:])
+        return segments
+
+    @staticmethod
+    def link_loc(
+        key: str, chain: tuple[str] = (), language: str = CWLocStore.LANGUAGE
+    ) -> "CWLoc":
+        # Replace the links of a value with the linked values of their names
+        # in the same language once, later lookups return it as it is
+        cwloc = CWLoc.ALL.lookup(key, language)
+        if cwloc.linked:
+            return cwloc
+        if key in chain:
+            raise Exception(f"linking cycle: {' > '.join(chain + (key,))}")
+        text = []
+        for segment in CWLoc.segments(cwloc.value):
+            if type(segment) is str:
+                text.append(segment)
                 continue
-            replacetext = CWLoc[oldtext[0]].value
-            if len(oldtext) > 2:
-                raise Exception(f"linking argument parsing error: {CWLoc.ALL[key]}")
-            elif len(oldtext) == 2:
-                # name = "$VAL|L$"
-                replacetext = f"#{oldtext[1]} {replacetext}#!"
-            newtext = newtext.replace(link, replacetext)
-        CWLoc.ALL[key].value = newtext
+            name, option = segment
+            value = CWLoc.link_loc(name, chain + (key,), language).value
+            # name = "$VAL|L$"
+            text.append(value if option is None else f"#{option} {value}#!")
+        cwloc.value = "".join(text)
+        cwloc.linked = True
+        return cwloc
 
     def __class_getitem__(cls, key) -> "CWLoc":
-        CWLoc.link_loc(key)
-        return cls.ALL[key]
+        # CWLoc[key] or CWLoc[key, language]
+        if type(key) is tuple:
+            return CWLoc.link_loc(key[0], language=key[1])
+        return CWLoc.link_loc(key)
 
     def __repr__(self):
         return f"{self.name}:{self.value}"
 
 
 # Regular YML parsers don't work on CK3 files
-def parse_file_yml(text: str) -> list[CWLoc]:
+# A line with a value, split at its first quote (no # before it)
+YML_REGEX = re.compile(r'^([^"\n#]*)"(.*)$', re.MULTILINE)
+
+
+def parse_yml(text: str) -> list[tuple[str, str]]:
+    # (name, value) of each line with a value, in order
+    # the name is up to the first : (ignore versioning number), the value
+    # up to the last quote, or the end of the line when it is not terminated
     # when reading \n becomes \\n (\\, n)
-    locs = []
-    lines = text.split("\n")
-    for key, line in enumerate(lines):
-        line = line.strip()
-        quotes = [key for key, value in enumerate(line) if value == '"']
-        if len(quotes) == 0:
-            continue  # line without a value
-
-        comment_index = line.find("#")
-        if comment_index != -1:
-            # comments before the string start are counted
-            # before that everything is part of the string
-            if quotes[0] > comment_index:
-                line = line[:comment_index].strip()
-                quotes = [key for key, value in enumerate(line) if value == '"']
-                if len(quotes) == 0:
-                    continue  # line without a value
-
-        name = line[: line.index(":")].strip()  # ignore versioning number
-        value = line[quotes[0] :].strip()  # sort things out inside
-        locs.append(CWLoc(name, value))
-    return locs
+    pairs = []
+    append = pairs.append
+    for before, after in YML_REGEX.findall(text):
+        colon = before.find(":")
+        if colon == -1:
+            # the : is after the quote, or missing (ValueError)
+            line = f'{before}"{after}'.strip()
+            name = line[: line.index(":")].strip()
+        else:
+            name = before[:colon].strip()
+        end = after.rfind('"')
+        append((name, after[:end] if end != -1 else after.rstrip()))
+    return pairs
+
+
+def parse_file_yml(text: str) -> list[CWLoc]:
+    # CWLoc.ALL.add(parse_yml(text), [file]) when the objects are not needed
+    from_pair = CWLoc.from_pair
+    return [from_pair(name, value) for name, value in parse_yml(text)]
@@ -1,4 +1,11 @@
+import contextlib
+import io
+import tempfile
+import time
+import zipfile
+import cwtypes
 from cwparser import *
+from cwtypes import *
 
 TESTS = {
     r"A": "IDENTIFIER:A",
@@ -25,46 +32,637 @@ TESTS = {
     r"@variable = @[val1*3.01] ": "LOCAL:@variable OP_EQUAL:= EXPRESSION:@[val1*3.01]",
 }
 
-for text, expected in TESTS.items():
-    tokens = list(tokenize(text, "TEST"))
-    expected_tokens = expected.split(" ")
-    if len(tokens) != len(expected_tokens):
-        print(f"Tokens size difference: {len(tokens)} - {len(expected_tokens)}")
-        print(text, expected)
-        print(tokens, expected_tokens)
-        print("----------------------------")
-        continue
-    has_difference = False
-    for token, expected_token in zip(tokens, expected_tokens):
-        if repr(token) != expected_token:
-            print(f"Token Difference: {repr(token)} - {expected_token}")
+for engine in (TOKENIZE_CHARWISE, TOKENIZE_REGEX):
+    for text, expected in TESTS.items():
+        tokens = list(tokenize(text, "TEST", engine))
+        expected_tokens = expected.split(" ")
+        if len(tokens) != len(expected_tokens):
+            print(f"<{engine}> Tokens size difference: {len(tokens)} - {len(expected_tokens)}")
             print(text, expected)
             print(tokens, expected_tokens)
-            has_difference = True
-    if has_difference:
+            print("----------------------------")
+            continue
+        has_difference = False
+        for token, expected_token in zip(tokens, expected_tokens):
+            if repr(token) != expected_token:
+                print(f"<{engine}> Token Difference: {repr(token)} - {expected_token}")
+                print(text, expected)
+                print(tokens, expected_tokens)
+                has_difference = True
+        if has_difference:
+            print("----------------------------")
+
+# Engines must agree on everything, source positions included
+TESTS = [
+    "A = { # comment\n\tB = C\n}\n\nD = yes",
+    'A = "multi\nline" B = @[ a + b ]\nC = 1066.\nD = -0.5',
+    "A\xa0 = B\r\nC != D ?= E\n@ = 1.2. F = 1.2.3.",
+    'A = ""\nB = NO C = Yes # a # b\n#\nD = 0001.1',
+    'A = "Ærø\nÉ" B = Ærø C = @é\n',
+]
+
+def positions(tokens: list[Token]) -> list[tuple]:
+    return [(t.type, t.token, t.offset, t.end, t.line, t.column) for t in tokens]
+
+
+for text in TESTS:
+    charwise = positions(tokenize(text, "TEST", TOKENIZE_CHARWISE))
+    regex = positions(tokenize(text, "TEST", TOKENIZE_REGEX))
+    stream = positions(tokenize_stream(text, "TEST"))
+    if not charwise == regex == stream:
+        print("ENGINE DIFFERENCE")
+        print(repr(text))
+        print(charwise)
+        print(regex)
+        print(stream)
         print("----------------------------")
+    for token_type, token, offset, end, line, column in regex:
+        # the span slices the token back out of the text
+        if Token(text[offset:end]).token != token:
+            print(f"SPAN DIFFERENCE: {repr(text)} {token} {offset}:{end}")
+
+# The bytes tokenizer decodes by itself, like read_file in text mode
+for text in TESTS:
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    expected = [(t.type, t.token, t.line) for t in tokenize(text, "TEST")]
+    for encoding in ("utf-8", "utf-8-sig", "windows-1252"):
+        for newline in ("\n", "\r\n"):
+            data = text.replace("\n", newline).encode(encoding)
+            result = [(t.type, t.token, t.line) for t in tokenize_bytes(data, "TEST")]
+            if result != expected:
+                print(f"BYTES DIFFERENCE <{encoding}> {repr(data)}")
+                print(expected)
+                print(result)
+                print("----------------------------")
+
+# Files are decoded once, to the same text as reading them in text mode
+with tempfile.TemporaryDirectory() as directory:
+    files = []
+    for index, text in enumerate(TESTS):
+        for encoding in ("utf-8", "utf-8-sig", "windows-1252"):
+            file = pathlib.Path(directory, f"{index}_{encoding}.txt")
+            file.write_bytes(text.encode(encoding))
+            files.append(file)
+    for file in files:
+        try:
+            expected = file.read_text(encoding="utf-8-sig")
+        except UnicodeDecodeError:
+            expected = file.read_text(encoding="windows-1252")
+        if read_file(file) != expected:
+            print(f"READ DIFFERENCE: {file.name} {repr(read_file(file))}")
+    # one file held at a time, still all of them in order
+    result = [file for file, _ in ReadAhead(files, read_file, limit=1)]
+    if result != files:
+        print(f"READ AHEAD DIFFERENCE: {result}")
+
+# Shared tokens are one instance per lexeme and can not be changed
+if shared_token("no") is not TOKEN_NO or TOKEN_NO.type != Token.BOOL:
+    print(f"SHARED TOKEN DIFFERENCE: {shared_token('no')}")
+try:
+    TOKEN_YES.token = "no"
+    print("SHARED TOKEN CHANGED")
+except Exception:
+    pass
+
+# Whole game directory comparison, only when the files are available
+GAMEPATH = pathlib.Path("game")
+if GAMEPATH.is_dir():
+    timings = {TOKENIZE_CHARWISE: 0, TOKENIZE_REGEX: 0}
+    total_tokens = 0
+    for file in sorted(GAMEPATH.glob("**/*.txt")):
+        text = read_file(file)
+        results = {}
+        for engine in timings:
+            start = time.perf_counter()
+            try:
+                results[engine] = positions(tokenize(text, file, engine))
+            except Exception as exception:
+                results[engine] = type(exception)
+            timings[engine] += time.perf_counter() - start
+        if results[TOKENIZE_CHARWISE] != results[TOKENIZE_REGEX]:
+            print(f"ENGINE DIFFERENCE: {file}")
+        elif type(results[TOKENIZE_REGEX]) is list:
+            total_tokens += len(results[TOKENIZE_REGEX])
+    for engine, timing in timings.items():
+        print(f"<{engine}> {total_tokens / timing:.0f} tokens/s")
 
 TESTS = {
     "A": QueueNotEmpty,
     "A=": QueueNotEmpty,
     "A=B": "A = B",
     "color = hsv {268 123 789}": "color = hsv\n{ { 268 123 789 } }",
-    "color {267 165 123}": "color = { { 267 165 123 } }"
+    "color {267 165 123}": "color = { { 267 165 123 } }",
+    'A = "x y" # c }\nB = { C >= 1.5 }': "A = x y\nB = { C >= 1.5 }",
+    "A = { B = @}": "A = { B = @ }",
+    "A = { B { C @} }": "A = { B = { { C @ } } }",
 }
 
-for text, expected in TESTS.items():
-    if type(expected) is type and issubclass(expected, Exception):
-        try:
-            parse_group(tokenize(text, "TEST"))
-            print(f"Expception Failed: {expected} {text}")
-        except expected:
-            pass
-        continue
-    cwobject = parse_group(tokenize(text, "TEST"))
-    described = "\n".join([cwobj.describe() for cwobj in cwobject])
+PARSERS = {
+    "parse_group": lambda text: parse_group(tokenize(text, "TEST")),
+    "parse_stream": lambda text: parse_stream(tokenize_stream(text, "TEST")),
+    # one character or byte per chunk
+    "parse_lazy": lambda text: parse_lazy(text, "TEST"),
+    "parse_chunks": lambda text: list(parse_chunks(text, "TEST")),
+    "parse_chunks bytes": lambda text: list(
+        parse_chunks([bytes([byte]) for byte in text.encode()], "TEST")
+    ),
+}
+
+for parser, parse in PARSERS.items():
+    for text, expected in TESTS.items():
+        if type(expected) is type and issubclass(expected, Exception):
+            try:
+                parse(text)
+                print(f"<{parser}> Expception Failed: {expected} {text}")
+            except expected:
+                pass
+            continue
+        cwobject = parse(text)
+        described = "\n".join([cwobj.describe() for cwobj in cwobject])
+        if described != expected:
+            print(f"<{parser}> DIFFERENCE")
+            print(described)
+            print("+++")
+            print(expected)
+            print("----------------------------")
+
+# Sections that were not asked for are skipped, even one character at a time
+text = 'a = { b = "}" } c = 1 d = { # }\n e = @[ } ] } a = 2'
+for chunks in (text, [text]):
+    sections = [cwobject.describe() for cwobject in parse_chunks(chunks, "TEST", ["a"])]
+    if sections != ["a = { b = } }", "a = 2"]:
+        print(f"SECTIONS DIFFERENCE: {sections}")
+
+# Chunked parses give tokens the lines and columns of a whole parse,
+# without an index of every line read
+def token_positions(cwobjects: list) -> list[tuple]:
+    found = []
+    for cwobject in cwobjects:
+        if type(cwobject) is Token:
+            found.append((cwobject.token, cwobject.line, cwobject.column))
+            continue
+        if cwobject.token is not None:
+            token = cwobject.token
+            found.append((token.token, token.line, token.column, len(token.line_index)))
+        if type(cwobject.values) is list:
+            found += token_positions(cwobject.values)
+        else:
+            found += token_positions([cwobject.values])
+    return found
+
+
+text = "skip = {\n}\n" * 200 + "a = {\n\tb = 1 c = { 2 3 }\n}\n" * 200
+text += 'd = "e\nf" g = 4'
+expected = token_positions(parse_group(tokenize(text, "TEST")))
+for size in (1, 7, 64):
+    chunks = [text[index : index + size] for index in range(0, len(text), size)]
+    found = token_positions(parse_chunks(chunks, "TEST", ["a", "d", "g"]))
+    if [position[:3] for position in found] != [
+        position[:3] for position in expected if position[0] != "skip"
+    ]:
+        print(f"CHUNK POSITIONS DIFFERENCE: {size}")
+    if max(position[3] for position in found if len(position) > 3) > 16:
+        print(f"CHUNK LINE INDEX DIFFERENCE: {size}")
+
+# Saves are read with or without their header, plain or with a zipped gamestate
+text = b"meta_data = { version = 1 }\nliving = { 1 = { name = A } }\nprovinces = { }\n"
+with tempfile.TemporaryDirectory() as directory:
+    plain = pathlib.Path(directory, "plain.ck3")
+    plain.write_bytes(b"SAV0102abcdef\n" + text)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as f:
+        f.writestr("meta", b"meta_data = { }")
+        f.writestr(SAVE_GAMESTATE, text)
+    zipped = pathlib.Path(directory, "zipped.ck3")
+    zipped.write_bytes(b"SAV0103abcdef\n" + archive.getvalue())
+    for path in (plain, zipped, str(plain)):
+        for chunk_size in (CWFeedParser.CHUNK_SIZE, 4):
+            sections = [
+                cwobject.describe()
+                for cwobject in parse_save(path, ["living", "provinces"], chunk_size)
+            ]
+            if sections != ["living = { 1 = { name = A } }", "provinces = { }"]:
+                print(f"SAVE DIFFERENCE: {path} {sections}")
+    if len(list(parse_save(plain))) != 3:
+        print(f"SAVE SECTIONS DIFFERENCE: {list(parse_save(plain))}")
+
+# Nesting deeper than the recursion limit
+text = "a = { " * 5000 + "}" * 5000
+for parser, parse in PARSERS.items():
+    if parser in ("parse_chunks bytes", "parse_lazy"):
+        continue  # too slow, one byte per chunk and brace matching at every level
+    depth = 0
+    cwobjects = parse(text)
+    while cwobjects:
+        depth += 1
+        cwobjects = cwobjects[0].values
+    if depth != 5000:
+        print(f"<{parser}> NESTING DIFFERENCE: {depth}")
+
+# Objects belong to the arena they were created in, siblings come from the parent
+with CWArena() as arena:
+    cwobject = parse_group(tokenize("a = { color = hsv { 1 2 3 } }", "TEST"))[0]
+if [cwobj.index for cwobj in arena] != [0, 1, 2, 3] or CWArena.current is arena:
+    print(f"ARENA DIFFERENCE: {arena}")
+color = cwobject.get("color", return_value=False)
+if cwobject.sibling(color).describe() != "{ { 1 2 3 } }" or cwobject.sibling(color, -1):
+    print(f"SIBLING DIFFERENCE: {cwobject.sibling(color)}")
+arena.release()
+if len(arena):
+    print(f"ARENA NOT RELEASED: {arena}")
+
+# Key lookups follow changes to the values
+cwobject = parse_group(tokenize("a = { b = 1 c = 2 b = 3 }", "TEST"))[0]
+found = [cwobject.find("b"), cwobject.find("d")]
+cwobject.append(parse_group(tokenize("d = 4", "TEST"))[0])
+cwobject.values.append(parse_group(tokenize("b = 5", "TEST"))[0])
+found += [cwobject.find("b"), cwobject.find("d")]
+if found != [[0, 2], [], [0, 2, 4], [3]]:
+    print(f"FIND DIFFERENCE: {found}")
+# keys changed in place, after the index was built, only for their object
+cwobject = parse_group(tokenize("a = { 1066 = { b = 1 } c = 2 }", "TEST"))[0]
+other = parse_group(tokenize("a = { 1066 = { } }", "TEST"))[0]
+found = [cwobject.find(1066), other.find(1066)]
+key_index = other.key_index
+cwobject.transform_key_into_date(cwobject[0])
+found += [cwobject.find(1066), cwobject.find("1066.1.1")]
+cwobject[1] = parse_group(tokenize("d = 3", "TEST"))[0]
+found += [cwobject.find("c"), cwobject.find("d"), other.find(1066)]
+if found != [[0], [0], [], [0], [], [1], [0]] or other.key_index is not key_index:
+    print(f"FIND CHANGED DIFFERENCE: {found}")
+
+# Projected parses only keep the listed keys, and what follows them
+projection = CWProjection(
+    {
+        CWProjection.ANY: CWProjection(
+            {"a": None, "b": CWProjection({"c": None}), CWProjection.DATE: None}
+        )
+    }
+)
+text = "x = { a = hsv { 1 } b = { c = 1 d = { c = 2 } } d = 1 e = f { 2 } 1066.1.1 = { } }"
+expected = "x = { a = hsv { { 1 } } b = { c = 1 } 1066.1.1 = { } }"
+for parser, parse in {
+    "parse_stream": lambda: parse_stream(tokenize_stream(text, "TEST"), projection),
+    "parse_lazy": lambda: parse_lazy(text, "TEST", projection=projection),
+}.items():
+    described = "\n".join([cwobject.describe() for cwobject in parse()])
     if described != expected:
-        print("DIFFERENCE")
-        print(described)
-        print("+++")
-        print(expected)
-        print("----------------------------")
+        print(f"<{parser}> PROJECTION DIFFERENCE: {described}")
+
+# Cached streams are the same as tokenized ones, files are tokenized again once changed
+with tempfile.TemporaryDirectory() as directory:
+    root = pathlib.Path(directory, "game")
+    root.mkdir()
+    file = root.joinpath("a.txt")
+    cache = CWParseCache(pathlib.Path(directory, "cache"), root)
+    results = []
+    for text in ("a = { b = 1.5 }\nc = \"d\"", None, "a = 2"):
+        if text is not None:
+            file.write_text(text, encoding="utf-8-sig")
+        results.append(positions(cache.tokenize(file)) == positions(tokenize_file(file)))
+    if results != [True] * 3 or (cache.hits, cache.misses) != (1, 2):
+        print(f"CACHE DIFFERENCE: {results} {cache}")
+    # lazy parses keep their bodies lazy, the cache is not used
+    file.write_text("a = { b = 1 }", encoding="utf-8")
+    cwobject = parse_file(file, lazy=True, cache=cache)[0]
+    if cwobject.span is None or (cache.hits, cache.misses) != (1, 2):
+        print(f"LAZY CACHE DIFFERENCE: {cwobject.span} {cache}")
+
+# Files tokenized by an executor parse the same, objects are numbered in file order
+with tempfile.TemporaryDirectory() as directory:
+    files = []
+    for index, text in enumerate(("a = { b = 1 }", "", "c = { d = { e = f } }\ng = 2")):
+        files.append(pathlib.Path(directory, f"{index}.txt"))
+        files[-1].write_text(text, encoding="utf-8")
+    results = []
+    # threads, so the test does not depend on how processes start
+    for executor in (None, concurrent.futures.ThreadPoolExecutor(2)):
+        with CWArena() as arena:
+            parsed = [
+                (file.name, [cwobject.describe() for cwobject in cwobjects])
+                for file, cwobjects in parse_files(files, executor=executor)
+            ]
+        results.append((parsed, [cwobject.index for cwobject in arena]))
+    if results[0] != results[1]:
+        print(f"PARSE FILES DIFFERENCE: {results}")
+    try:
+        parse_files(files, lazy=True, executor=executor)
+        print("PARSE FILES LAZY WITH AN EXECUTOR")
+    except ValueError:
+        pass
+    executor.shutdown()
+
+# Localization lines, comments before the value and versions are skipped
+text = """﻿l_english:
+ a:0 "A value" # comment
+ # b:0 "commented"
+ c: "unterminated  
+ d:1 "say "hi"" # "quoted"
+e "no: colon before"
+ f:0 ""
+"""
+expected = [
+    ("a", "A value"),
+    ("c", "unterminated"),
+    ("d", 'say "hi"" # "quoted'),  # up to the last quote
+    ('e "no', "no: colon before"),
+    ("f", ""),
+]
+if parse_yml(text) != expected:
+    print(f"YML DIFFERENCE: {parse_yml(text)}")
+locs = CWLocStore()
+locs.add(parse_yml(text))
+# made into a CWLoc once, when looked up
+if locs["a"] is not locs["a"] or locs["a"].value != "A value" or locs.get("z"):
+    print(f"LOC STORE DIFFERENCE: {locs}")
+
+# Links are replaced through other links once, cycles are errors
+CWLoc.ALL = CWLocStore()
+CWLoc.ALL.add(
+    [
+        ("a", "$b$ of $c|U$ $NAME$"),
+        ("b", "Duke $c$"),
+        ("c", "York"),
+        ("x", "$y$"),
+        ("y", "$x$"),
+    ]
+)
+if CWLoc["a"].value != "Duke York of #U York#! $NAME$" or not CWLoc["b"].linked:
+    print(f"LINK DIFFERENCE: {CWLoc.ALL.values()}")
+try:
+    CWLoc["x"]
+    print("LINK CYCLE NOT FOUND")
+except RecursionError:
+    print("LINK CYCLE NOT FOUND")
+except Exception:
+    pass
+CWLoc.ALL = CWLocStore()
+
+# Indexed localization reads the same values from the files, the first one is kept
+with tempfile.TemporaryDirectory() as directory:
+    texts = [' a:0 "Ærø" # x\r\n b: "one\\n" \r c "d: e"\r\n', ' a:1 "second"\n f:0 "é"']
+    files = []
+    for text, encoding in zip(texts, ("utf-8-sig", "windows-1252")):
+        files.append(pathlib.Path(directory, f"{len(files)}.yml"))
+        files[-1].write_bytes(text.encode(encoding))
+    expected = {}
+    for file in files:
+        for name, value in parse_yml(read_file(file)):
+            expected.setdefault(name, value)
+    path = pathlib.Path(directory, "cache", "test" + CWLocIndex.SUFFIX)
+    for built in (True, False):  # then loaded
+        locs = CWLocStore()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            locs.add_index(CWLocIndex.open(files, path))
+        found = {name: locs[name].value for name in expected}
+        if found != expected or "z" in locs or len(locs.indexes[0]) != len(expected):
+            print(f"LOC INDEX DIFFERENCE: {found}")
+        if (output.getvalue() == "Duplicate Loc: a\n") != built:
+            print(f"LOC INDEX DUPLICATES: {output.getvalue()}")
+
+# Other languages are read from the same files once looked up, names are kept once
+with tempfile.TemporaryDirectory() as directory:
+    texts = {
+        "english": (' a:0 "Duke $b$"\n b:0 "York"\n', ' c:0 "Indexed"\n'),
+        "french": (' a:0 "Duc $b$"\n b:0 "Yorck"\n d:0 "Seul"\n', ' c:0 "Indexé"\n'),
+    }
+    files = {}
+    for language, (text, indexed) in texts.items():
+        folder = pathlib.Path(directory, "localization", language)
+        folder.mkdir(parents=True)
+        files[language] = [folder / f"{name}_l_{language}.yml" for name in "ac"]
+        files[language][0].write_text(text, encoding="utf-8-sig")
+        files[language][1].write_text(indexed, encoding="utf-8-sig")
+    CWLoc.ALL = CWLocStore()
+    path = pathlib.Path(directory, "cache", "c" + CWLocIndex.SUFFIX)
+    CWLoc.ALL.add(parse_yml(read_file(files["english"][0])), files["english"][:1])
+    CWLoc.ALL.add_index(CWLocIndex.open(files["english"][1:], path), path)
+    names = len(CWLoc.ALL)
+    if "french" in CWLoc.ALL.languages or CWLoc["a"].value != "Duke York":
+        print(f"LANGUAGE DIFFERENCE: {CWLoc.ALL.languages}")
+    found = [CWLoc["a", "french"].value, CWLoc["c", "french"].value]
+    if found != ["Duc Yorck", "Indexé"] or CWLoc["c"].value != "Indexed":
+        print(f"LANGUAGE DIFFERENCE: {found}")
+    # only d is new, it has no english value
+    if len(CWLoc.ALL) != names + 1 or "d" in CWLoc.ALL or len(CWLoc.ALL.values()) != 2:
+        print(f"LANGUAGE NAMES DIFFERENCE: {dict(CWLoc.ALL)}")
+    if not CWLoc.ALL.contains("d", "french") or CWLoc.ALL.get("d", language="german"):
+        print(f"LANGUAGE LOOKUP DIFFERENCE: {CWLoc.ALL.languages}")
+    CWLoc.ALL = CWLocStore()
+
+# Snapshots load what was saved, lists shared by objects stay shared,
+# and are out of date once a file read changes
+with tempfile.TemporaryDirectory() as directory:
+    file = pathlib.Path(directory, "provinces.txt")
+    file.write_text("1 = { holding = castle_holding }")
+    CWItem.FILES = [file]
+    text = "1066.9.15 = { holding = city_holding terrain = hills }"
+    province, mapped = CWHistoryProvince(), CWHistoryProvince()
+    province.name, mapped.name = 1, 2
+    province.dates = [
+        CWHistoryDate.handle_object(parse_group(tokenize(text, "TEST"))[0])
+    ]
+    mapped.dates, mapped.from_map = province.dates, True
+    CWHistoryProvince.ALL = {1: province, 2: mapped}
+    CWLoc.ALL = CWLocStore()
+    CWLoc.ALL.add([("a", "A value")])
+    path = pathlib.Path(directory, "cache", "snapshot")
+    CWSnapshot().save(path)
+    CWHistoryProvince.ALL, CWItem.FILES, CWLoc.ALL = {}, [], CWLocStore()
+    if not CWSnapshot().load(path):
+        print("SNAPSHOT NOT LOADED")
+    loaded = CWHistoryProvince.ALL
+    date = loaded[1].dates[0]
+    found = [date.datenum, date.holding, date.terrain, date.culture, CWLoc["a"].value]
+    if found != [10660915, "city_holding", "hills", None, "A value"]:
+        print(f"SNAPSHOT DIFFERENCE: {found}")
+    if loaded[2].dates is not loaded[1].dates or not loaded[2].from_map:
+        print(f"SNAPSHOT SHARED DIFFERENCE: {loaded}")
+    if CWItem.FILES != [file]:
+        print(f"SNAPSHOT FILES DIFFERENCE: {CWItem.FILES}")
+    file.write_text("1 = { holding = city_holding }")
+    if CWSnapshot().load(path):
+        print("SNAPSHOT LOADED AFTER A FILE CHANGED")
+    # so are snapshots of other loader sources or constants
+    source = pathlib.Path(directory, "loader.py")
+    source.write_text("DATES = ['867.1.1']")
+    CWSnapshot([], [source], (["867.1.1"],)).save(path)
+    found = [
+        CWSnapshot([], [source], (["867.1.1"],)).load(path),
+        CWSnapshot([], [source], (["1066.9.15"],)).load(path),
+        CWSnapshot().load(path),
+    ]
+    source.write_text("DATES = ['1066.9.15']")
+    found.append(CWSnapshot([], [source], (["867.1.1"],)).load(path))
+    if found != [True, False, False, False]:
+        print(f"SNAPSHOT SOURCES DIFFERENCE: {found}")
+    CWHistoryProvince.ALL, CWItem.FILES, CWLoc.ALL = {}, [], CWLocStore()
+
+# Timelines give the date compare_history found: the last one up to a date,
+# on the same date the one defined later, never one before the base
+text = """
+1066.9.15 = { holding = a } 900.1.1 = { terrain = t } 1066.9.15 = { holding = b }
+1100.1.1 = { holding = c } 1000.1.1 = { holding = d } 1.1.1 = { holding = e }
+1066.9.15 = { terrain = u }
+"""
+dates = parse_group(tokenize(text, "TEST"))
+dates = [CWHistoryDate.handle_object(date) for date in dates]
+stub = CWHistoryDate()
+stub.datenum = 10101
+
+
+def compare_history(field: str, dates: list, base, limit: int):
+    comparision_date = base
+    for date in dates:
+        if date.get(field) is None or date > limit:
+            continue
+        if comparision_date is not None and date < comparision_date:
+            continue
+        comparision_date = date
+    return comparision_date
+
+
+for field in ("holding", "terrain", "culture"):
+    timeline = CWTimeline(dates, lambda date: date.get(field) is not None)
+    for base in [None, stub] + dates:
+        for limit in (0, 10101, 9000101, 10000101, 10660914, 10660915, 20000101):
+            found = timeline.at(limit, base)
+            found = base if found is None else found
+            if found is not compare_history(field, dates, base, limit):
+                base = None if base is None else base.datenum
+                print(f"TIMELINE DIFFERENCE: {field} {base} {limit}")
+
+# Dates keep only the fields they set, the others read as None
+date = dates[1]  # 900.1.1 = { terrain = t }
+if date.terrain != "t" or date.get("terrain") is not date.terrain:
+    print(f"DATE FIELD DIFFERENCE: {date.names} {date.values}")
+for field in ("holding", "culture", "effect", "de_jure_liege"):
+    if date.get(field) is not None or getattr(date, field) is not None:
+        print(f"DATE UNSET DIFFERENCE: {field}")
+if CWHistoryDate().holding is not None or dates[0].names is not dates[2].names:
+    print(f"DATE NAMES DIFFERENCE: {dates[0].names} {dates[2].names}")
+with contextlib.suppress(AttributeError):
+    date.unknown_field
+    print("DATE ATTRIBUTE DIFFERENCE: no error")
+if hasattr(date, "__dict__"):
+    print("DATE SLOTS DIFFERENCE")
+
+# The history state gives every title the value its timeline gives
+registries = (
+    CWTitle.ALL, CWTitle.PROVINCES, CWCulture.ALL, CWFaith.ALL, CWBuilding.ALL
+)
+
+
+def stub(cls, name):
+    item = cls.__new__(cls)
+    item.name = name
+    return item
+
+
+CWTitle.ALL = {name: stub(CWTitle, name) for name in ("e_a", "k_a", "d_b")}
+CWTitle.PROVINCES = {number: stub(CWTitle, f"b_{number}") for number in (1, 2, 3)}
+CWCulture.ALL = {name: stub(CWCulture, name) for name in ("c1", "c2")}
+CWFaith.ALL = {name: stub(CWFaith, name) for name in ("f1", "f2")}
+CWBuilding.ALL = {"s1": stub(CWBuilding, "s1")}
+text = """
+1 = {
+    culture = c1 religion = f1 1066.1.1 = { culture = c2 } 1066.1.1 = { religion = f2 }
+    1100.1.1 = { special_building_slot = s1 special_building = s1 }
+    1200.1.1 = { culture = c1 }
+}
+2 = { 1000.1.1 = { culture = c2 } }
+3 = { holding = castle_holding }
+"""
+for cwobject in parse_group(tokenize(text, "TEST")):
+    CWHistoryProvince.handle_object(cwobject)
+text = """
+k_a = {
+    1000.1.1 = { holder = 5 } 1066.1.1 = { holder = 0 de_jure_liege = e_a }
+    1066.1.1 = { holder = 7 }
+}
+d_b = { 1066.1.1 = { de_jure_liege = 0 change_development_level = 2 } }
+"""
+for cwobject in parse_group(tokenize(text, "TEST")):
+    CWHistoryTitle.handle_object(cwobject)
+datenums = [0, 10101, 10000101, 10660101, 10990101, 11000101, 12000101, 20000101]
+if numpy is None:
+    try:
+        CWHistoryState()
+        print("HISTORY STATE DIFFERENCE: no error without numpy")
+    except Exception as error:
+        if "numpy" not in str(error):
+            print(f"HISTORY STATE DIFFERENCE: {error}")
+else:
+    state = CWHistoryState()
+    for field, province in CWHistoryState.FIELDS.items():
+        result = state.at(field, datenums)
+        histories = CWHistoryProvince.ALL if province else CWHistoryTitle.ALL
+        for history in histories.values():
+            title = history.barony.name if province else history.name
+            for datenum, values in zip(datenums, result):
+                date = history.timeline(field).at(datenum)
+                value = None if date is None else date.get(field)
+                value = value.token if type(value) is Token else value
+                found = state.values[values[state.ids[title]]] \
+                    if title in state.ids else None
+                if value != found:
+                    print(f"HISTORY STATE DIFFERENCE: {field} {title} {datenum}")
+        found = state.values_at(field, 11000101)
+        if any(state.values[values] != found.get(state.entities[entity])
+               for entity, values in enumerate(result[5])):
+            print(f"HISTORY STATE VALUES DIFFERENCE: {field} {found}")
+CWHistoryProvince.ALL, CWHistoryTitle.ALL = {}, {}
+CWTitle.ALL, CWTitle.PROVINCES, CWCulture.ALL, CWFaith.ALL, CWBuilding.ALL = registries
+
+# Mapped provinces share their source dates, a duplicate province gets a new
+# dates list and timelines, the values at every date hold for both
+CWTitle.PROVINCES = {number: stub(CWTitle, f"b_{number}") for number in (1, 2, 3)}
+text = """
+1 = { holding = castle_holding 1066.1.1 = { holding = city_holding } }
+3 = { holding = church_holding }
+"""
+for cwobject in parse_group(tokenize(text, "TEST")):
+    CWHistoryProvince.handle_object(cwobject)
+province = CWHistoryProvince.ALL[1]
+dates, timeline = province.dates, province.timeline("holding")
+text = "1 = { 1100.1.1 = { holding = tribal_holding } 1066.1.1 = { terrain = hills } }"
+for cwobject in parse_group(tokenize(text, "TEST")):
+    CWHistoryProvince.handle_object(cwobject)
+province = CWHistoryProvince.ALL[1]
+if province.dates is dates or len(dates) != 2 or len(province.dates) != 5:
+    print(f"DUPLICATE PROVINCE DIFFERENCE: {dates} {province.dates}")
+if province.timeline("holding") is timeline:
+    print("DUPLICATE PROVINCE TIMELINE DIFFERENCE")
+paths = CWItem.PATH, cwtypes.BASEPATH
+with tempfile.TemporaryDirectory() as directory:
+    CWItem.PATH = cwtypes.BASEPATH = pathlib.Path(directory)
+    file = CWItem.PATH.joinpath("history/province_mapping/00_map.txt")
+    file.parent.mkdir(parents=True)
+    file.write_text("2 = 1\n3 = 1\n4 = 1\n")
+    with contextlib.redirect_stdout(io.StringIO()):
+        CWHistoryProvince.after_load()
+    CWItem.PATH, cwtypes.BASEPATH = paths
+mapped = CWHistoryProvince.ALL[2]
+if mapped.dates is not province.dates or mapped.timelines is not province.timelines \
+        or not mapped.from_map or mapped.barony.name != "b_2":
+    print(f"MAPPED PROVINCE DIFFERENCE: {mapped.dates} {mapped.barony}")
+if 4 in CWHistoryProvince.ALL or CWHistoryProvince.ALL[3].from_map:
+    print(f"MAPPED PROVINCE DIFFERENCE: {CWHistoryProvince.ALL}")
+expected = {
+    10101: ["castle_holding", None, "church_holding"],
+    10660101: ["city_holding", "hills", "church_holding"],
+    10991231: ["city_holding", "hills", "church_holding"],
+    11000101: ["tribal_holding", "hills", "church_holding"],
+    20000101: ["tribal_holding", "hills", "church_holding"],
+}
+for datenum, values in expected.items():
+    for number in (1, 2):
+        found = []
+        for field in ("holding", "terrain"):
+            date = CWHistoryProvince.ALL[number].timeline(field).at(datenum)
+            found.append(None if date is None else date.get(field))
+        date = CWHistoryProvince.ALL[3].timeline("holding").at(datenum)
+        found.append(date.holding)
+        if found != values:
+            print(f"MAPPED PROVINCE VALUES DIFFERENCE: {number} {datenum} {found}")
+CWHistoryProvince.ALL, CWItem.FILES, CWTitle.PROVINCES = {}, [], registries[1]
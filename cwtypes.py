@@ -1,11 +1,29 @@
 import pathlib
-import copy
+import bisect
+import collections
+import concurrent.futures
+import hashlib
+import marshal
 import math
+import multiprocessing
+import os
+import sys
+import time
 from cwparser import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None  # only needed by CWHistoryState
+
 BASEPATH = pathlib.Path(
     r"game"
 )
+# parse_file cache, files are only tokenized again once they change
+CACHEPATH = pathlib.Path(
+    r"cache"
+)
+SNAPSHOTPATH = CACHEPATH.joinpath("snapshot")
 
 
 def load_loc(file: pathlib.Path) -> dict:
@@ -116,6 +134,19 @@ class CWCondition:
 class CWItem:
     PATH = BASEPATH
     PATH_LOC = BASEPATH
+    LAZY_PARSE = False  # only parse the blocks handle_object looks at
+    PROJECTION: CWProjection = None  # keys handle_object uses, None for all
+    # tokenized files kept between runs, ex: CWParseCache(CACHEPATH, BASEPATH)
+    # every file is then read and hashed, not used for LAZY_PARSE items
+    PARSE_CACHE: CWParseCache = None
+    # processes tokenizing files, 1 for none, ex: os.cpu_count()
+    # not used for LAZY_PARSE items, see read_files
+    PARSE_WORKERS = 1
+    EXECUTOR: concurrent.futures.ProcessPoolExecutor = None  # shared by all items
+    FILES: list[pathlib.Path] = []  # every file read, see CWSnapshot
+    DEPENDS: tuple[type["CWItem"]] = ()  # items handle_object and after_load look up
+    LOC_INDEX = False  # index localization, values are read when looked up
+    SNAPSHOT = ("ALL",)  # class attributes kept by serialize
     ALL: dict[str, "CWItem"] = {}
 
     def __init__(self):
@@ -136,33 +167,105 @@ class CWItem:
         pass
 
     @classmethod
-    def load_files(cls):
-        if cls.PATH.is_file():
-            files = [cls.PATH]
-        else:
-            files = sorted(cls.PATH.glob("*.txt"))
-        for file in files:
+    def load_files(cls, parsed: Iterable = None, localization: Iterable = None):
+        # parsed and localization are read_files and read_localization
+        # results, for reading ahead of loading (see CWScheduler)
+        if parsed is None:
+            parsed = cls.read_files()
+        for file, cwobjects in parsed:
             print(f"<{cls.__name__}> Reading: {file.relative_to(BASEPATH)}")
-            tokens = tokenize(read_file(file), file)
-            cwobjects = parse_group(tokens)
+            CWItem.FILES.append(file)
             for cwobject in cwobjects:
                 cls.handle_object(cwobject)
         cls.after_load()
-        cls.load_localization()
+        cls.load_localization(localization)
 
     @classmethod
-    def load_localization(cls):
-        if cls.PATH_LOC == BASEPATH:
-            return  # do not load all files!!!
-        if type(cls.PATH_LOC) in (list, map):
-            files = cls.PATH_LOC
-        elif cls.PATH_LOC.is_file():
-            files = [cls.PATH_LOC]
+    def read_files(cls) -> Iterable[tuple[pathlib.Path, list[CWObject]]]:
+        # parse_files of the item files, with an executor they start now
+        if cls.PATH == BASEPATH:
+            return []  # localization only
+        if cls.PATH.is_file():
+            files = [cls.PATH]
         else:
-            files = cls.PATH_LOC.glob("*.yml")
-        for file in files:
+            files = sorted(cls.PATH.glob("*.txt"))
+        return parse_files(
+            files,
+            cls.LAZY_PARSE,
+            cls.item_projection(),
+            cls.PARSE_CACHE,
+            None if cls.LAZY_PARSE else cls.executor(len(files)),
+        )
+
+    @classmethod
+    def executor(cls, files: int) -> concurrent.futures.ProcessPoolExecutor:
+        # None when there is nothing to share between workers
+        if cls.PARSE_WORKERS <= 1 or files <= 1:
+            return None
+        return CWItem.start_executor(cls.PARSE_WORKERS)
+
+    @staticmethod
+    def start_executor(workers: int) -> concurrent.futures.ProcessPoolExecutor:
+        # the shared pool, made once. Workers are only made once files are
+        # given to it, while reader threads run, so they are never forked
+        # from this process: forkserver, or spawn where there is none
+        if CWItem.EXECUTOR is None:
+            methods = multiprocessing.get_all_start_methods()
+            method = "forkserver" if "forkserver" in methods else "spawn"
+            CWItem.EXECUTOR = concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context(method)
+            )
+        return CWItem.EXECUTOR
+
+    @staticmethod
+    def shutdown_executor():
+        # workers are only needed while loading, see load_items
+        if CWItem.EXECUTOR is not None:
+            CWItem.EXECUTOR.shutdown()
+            CWItem.EXECUTOR = None
+
+    @classmethod
+    def item_projection(cls) -> CWProjection:
+        # Every top level key is an item
+        if cls.PROJECTION is None:
+            return None
+        return CWProjection({CWProjection.ANY: cls.PROJECTION})
+
+    @classmethod
+    def load_localization(cls, localization: Iterable = None):
+        if cls.LOC_INDEX:
+            files = cls.localization_files()
+            for file in files:
+                print(f"<{cls.__name__}> Reading: {file.relative_to(BASEPATH)}")
+                CWItem.FILES.append(file)
+            path = CACHEPATH.joinpath(cls.__name__ + CWLocIndex.SUFFIX)
+            CWLoc.ALL.add_index(CWLocIndex.open(files, path, CWLoc.ALL), path)
+            return
+        if localization is None:
+            localization = cls.read_localization()
+        for file, text in localization:
             print(f"<{cls.__name__}> Reading: {file.relative_to(BASEPATH)}")
-            _ = parse_file_yml(read_file(file))  # CWLoc init handles it
+            CWItem.FILES.append(file)
+            CWLoc.ALL.add(parse_yml(text), [file])
+
+    @classmethod
+    def localization_files(cls) -> list[pathlib.Path]:
+        if cls.PATH_LOC == BASEPATH:
+            return []  # do not load all files!!!
+        if not isinstance(cls.PATH_LOC, pathlib.Path):
+            return list(cls.PATH_LOC)  # list or glob
+        if cls.PATH_LOC.is_file():
+            return [cls.PATH_LOC]
+        return list(cls.PATH_LOC.glob("*.yml"))
+
+    @classmethod
+    def read_localization(
+        cls, executor: concurrent.futures.Executor = None
+    ) -> Iterable[tuple[pathlib.Path, str]]:
+        # Text of the localization files, read ahead by the executor threads
+        if cls.LOC_INDEX:
+            return None  # only indexed, see load_localization
+        return ReadAhead(cls.localization_files(), read_file, executor)
 
     @classmethod
     def warning(cls, message: str):
@@ -173,12 +276,12 @@ class CWItem:
         raise Exception(f"<{cls.__name__}> {message}")
 
     @classmethod
-    def serialize(cls):
-        cls.error("serialize not implemented")
+    def serialize(cls, snapshot: "CWSnapshot"):
+        snapshot.store(cls, cls.SNAPSHOT)
 
     @classmethod
-    def deserialize(cls):
-        cls.error("deserialize not implemented")
+    def deserialize(cls, snapshot: "CWSnapshot"):
+        snapshot.restore(cls, cls.SNAPSHOT)
 
 
 class CWLocal(CWItem):
@@ -274,7 +377,7 @@ class CWColor(CWItem):
         cwcolor = CWColor()
         colors = cwobject.get("color", return_value=False)
         if colors is None:
-            cwcolor.values = [Token("255"), Token("255"), Token("255")]
+            cwcolor.values = [shared_token("255")] * 3
             cwcolor.type = CWColor.REGULAR
             return cwcolor
 
@@ -287,7 +390,7 @@ class CWColor(CWItem):
                 cwcolor.type = CWColor.REGULARV
             else:  # reference
                 return CWColor.ALL[colors.values.token]
-            colors = CWObject.ALL[colors.index + 1]
+            colors = cwobject.sibling(colors)
 
         if len(colors.values[0].values) != 3:
             cwcolor.error("amount of values in colors incorect")
@@ -355,7 +458,9 @@ class CWTitle(CWItem):
     PATH_LOC = CWItem.PATH.joinpath(
         "localization/english/titles_l_english.yml")
     ALL: dict[str, "CWTitle"] = {}
+    DEPENDS = (CWColor,)
     PROVINCES: dict[int, "CWTitle"] = {}
+    SNAPSHOT = ("ALL", "PROVINCES")
 
     # Ranks
     BARONY = "BARONY"
@@ -375,6 +480,31 @@ class CWTitle(CWItem):
         "b_": BARONY,
     }
 
+    PROJECTION = CWProjection(
+        {
+            "color": None,
+            "landless": None,
+            "destroy_if_invalid_heir": None,
+            "no_automatic_claims": None,
+            "definite_form": None,
+            "always_follows_primary_heir": None,
+            "ruler_uses_title_name": None,
+            "can_be_named_after_dynasty": None,
+            "province": None,
+            "capital": None,
+            "de_jure_drift_disabled": None,
+            "male_names": None,
+            "female_names": None,
+            "ai_primary_priority": None,
+            "can_create": None,
+            "can_create_on_partition": None,
+            "can_destroy": None,
+            "cultural_names": None,
+            # Nested Titles
+            **{f"{prefix}*": CWProjection.SELF for prefix in RANKS},
+        }
+    )
+
     def __init__(self):
         self.raw: CWObject = None
         self.name: str = None
@@ -464,23 +594,23 @@ class CWTitle(CWItem):
 
         # There are missing entries here on purpose
         # as they are not used in the game code
-        cwitem.landless = cwobject.get("landless", default_value=Token("no"))
+        cwitem.landless = cwobject.get("landless", default_value=TOKEN_NO)
         cwitem.destroy_if_invalid_heir = cwobject.get(
-            "destroy_if_invalid_heir", default_value=Token("no")
+            "destroy_if_invalid_heir", default_value=TOKEN_NO
         )
         cwitem.no_automatic_claims = cwobject.get(
-            "no_automatic_claims", default_value=Token("no")
+            "no_automatic_claims", default_value=TOKEN_NO
         )
         cwitem.definite_form = cwobject.get(
-            "definite_form", default_value=Token("no"))
+            "definite_form", default_value=TOKEN_NO)
         cwitem.always_follows_primary_heir = cwobject.get(
-            "always_follows_primary_heir", default_value=Token("no")
+            "always_follows_primary_heir", default_value=TOKEN_NO
         )
         cwitem.ruler_uses_title_name = cwobject.get(
-            "ruler_uses_title_name", default_value=Token("yes")
+            "ruler_uses_title_name", default_value=TOKEN_YES
         )
         cwitem.can_be_named_after_dynasty = cwobject.get(
-            "can_be_named_after_dynasty", default_value=Token("yes")
+            "can_be_named_after_dynasty", default_value=TOKEN_YES
         )
 
         province = cwobject.get("province", allow_multiple=True)
@@ -494,7 +624,7 @@ class CWTitle(CWItem):
 
         cwitem.capital = cwobject.get("capital")  # Handled Later
         cwitem.de_jure_drift_disabled = cwobject.get(
-            "de_jure_drift_disabled", default_value=Token("no")
+            "de_jure_drift_disabled", default_value=TOKEN_NO
         )
         cwitem.male_names = cwobject.get(
             "male_names", default_value=cwitem.male_names)
@@ -531,6 +661,8 @@ class CWBuilding(CWItem):
             "localization/english/dlc/fp3/dlc_fp3_culture_l_english.yml"),
     ]
     ALL: dict[str, "CWBuilding"] = {}
+    LAZY_PARSE = True
+    PROJECTION = CWProjection({"next_building": None})
 
     def __init__(self):
         self.raw: CWObject = None
@@ -628,6 +760,22 @@ class CWBuilding(CWItem):
 class CWTradition(CWItem):
     PATH = CWItem.PATH.joinpath("common/culture/traditions")
     ALL: dict[str, "CWTradition"] = {}
+    LAZY_PARSE = True
+    PROJECTION = CWProjection(
+        {
+            "category": None,
+            "is_shown": None,
+            "can_pick": None,
+            "parameters": None,
+            "character_modifier": None,
+            "province_modifier": None,
+            "county_modifier": None,
+            "doctrine_character_modifier": None,
+            "culture_modifier": None,
+            "cost": None,
+            "ai_will_do": None,
+        }
+    )
 
     def __init__(self):
         self.raw: CWObject = None
@@ -692,6 +840,20 @@ class CWCulture(CWItem):
         "localization/english/culture/cultures_l_english.yml"
     )
     ALL: dict[str, "CWCulture"] = {}
+    DEPENDS = (CWColor,)
+    PROJECTION = CWProjection(
+        {
+            "color": None,
+            "created": None,
+            "history_loc_override": None,
+            "traditions": None,
+            "ethos": None,
+            "heritage": None,
+            "language": None,
+            "name_list": None,
+            "ethnicities": None,
+        }
+    )
 
     def __init__(self):
         self.raw: CWObject = None
@@ -741,6 +903,7 @@ class CWCulture(CWItem):
 class CWReligionFamily(CWItem):
     PATH = CWItem.PATH.joinpath("common/religion/religion_families")
     ALL: dict[str, "CWReligionFamily"] = {}
+    PROJECTION = CWProjection({"is_pagan": None})
 
     def __init__(self):
         self.raw: CWObject = None
@@ -765,7 +928,7 @@ class CWReligionFamily(CWItem):
         if cwitem.name in cls.ALL:
             cls.error(f"Duplicate Title: {cwitem.name}")
         cls.ALL[cwitem.name] = cwitem
-        cwitem.is_pagan = cwobject.get("is_pagan", default_value=Token("no"))
+        cwitem.is_pagan = cwobject.get("is_pagan", default_value=TOKEN_NO)
 
     @classmethod
     def after_load(cls):
@@ -775,6 +938,10 @@ class CWReligionFamily(CWItem):
 class CWHolySite(CWItem):
     PATH = CWItem.PATH.joinpath("common/religion/holy_sites/00_holy_sites.txt")
     ALL: dict[str, "CWHolySite"] = {}
+    DEPENDS = (CWTitle,)
+    PROJECTION = CWProjection(
+        {"county": None, "barony": None, "character_modifier": None}
+    )
 
     def __init__(self):
         self.raw: CWObject = None
@@ -813,6 +980,9 @@ class CWHolySite(CWItem):
 class CWFaith(CWItem):
     ALL: dict[str, "CWFaith"] = {}
     PATH_LOC = CWItem.PATH.joinpath("localization/english/religion")
+    PROJECTION = CWProjection(
+        {"color": None, "religious_head": None, "holy_site": None, "doctrine": None}
+    )
 
     def __init__(self):
         self.raw: CWObject = None
@@ -866,6 +1036,16 @@ class CWFaith(CWItem):
 class CWReligion(CWItem):
     PATH = CWItem.PATH.joinpath("common/religion/religions")
     ALL: dict[str, "CWReligion"] = {}
+    DEPENDS = (CWColor, CWTitle, CWReligionFamily, CWHolySite)
+    PROJECTION = CWProjection(
+        {
+            "family": None,
+            "pagan_roots": None,
+            "doctrine": None,
+            "traits": None,
+            "faiths": CWProjection({CWProjection.ANY: CWFaith.PROJECTION}),
+        }
+    )
 
     def __init__(self):
         self.raw: CWObject = None
@@ -895,7 +1075,7 @@ class CWReligion(CWItem):
         cwitem.family = CWReligionFamily.ALL[cwobject.get("family").token]
 
         cwitem.pagan_roots = cwobject.get(
-            "pagan_roots", default_value=Token("no"))
+            "pagan_roots", default_value=TOKEN_NO)
         cwitem.doctrine = cwobject.get(
             "doctrine", allow_multiple=True, default_value=[]
         )
@@ -908,64 +1088,92 @@ class CWReligion(CWItem):
 
 
 class CWHistoryDate:
+    PROJECTION = CWProjection(
+        {
+            # Generic
+            "effect": None,
+            # Province
+            "culture": None,
+            "religion": None,
+            "terrain": None,
+            "holding": None,
+            "buildings": None,
+            "duchy_capital_building": None,
+            "special_building": None,
+            "special_building_slot": None,
+            # Title
+            "holder": None,
+            "de_jure_liege": None,
+            "government": None,
+            "name": None,
+            "liege": None,
+            "change_development_level": None,
+            "insert_title_history": None,
+            "reset_name": None,
+            "succession_laws": None,
+            "holder_ignore_head_of_faith_requirement": None,
+            "remove_succession_laws": None,
+        }
+    )
+    # Items with dates, the undated values are the 1.1.1 date
+    HISTORY = CWProjection(PROJECTION.keys | {CWProjection.DATE: PROJECTION})
+
+    # Optional fields, only the ones set are kept: their names, a tuple shared
+    # by the dates setting the same ones, and their values. The others read
+    # as None: date.culture, date.get("culture")
+    # Generic: effect (list[CWObject | Token])
+    # Province: culture (CWCulture), religion (CWFaith), terrain, holding,
+    # buildings (Token list), duchy_capital_building (Token), special_building
+    # and special_building_slot (CWBuilding)
+    # Title: de_jure_liege (CWTitle, or Token 0), succession_laws (CWObject),
+    # holder, government, name, liege, change_development_level, reset_name,
+    # insert_title_history, holder_ignore_head_of_faith_requirement and
+    # remove_succession_laws (Token)
+    FIELDS = frozenset(PROJECTION.keys)
+    NAMES: dict[tuple[str], tuple[str]] = {}  # the shared names tuples
+    __slots__ = ("date", "datenum", "index", "names", "values")
 
     def __init__(self):
         # On conflicting dates, latter defined takes priority
         self.date: Token = None
         self.datenum: int = None
         self.index: int = None  # for priority
-        self.from_map: bool = False  # data copied has higher priority
-        # Generic
-        self.effect: CWObject | Token = None
-        # Province
-        self.culture: CWCulture = None
-        self.religion: CWFaith = None
-        self.terrain: Token = None
-        self.holding: Token = None
-        self.buildings: list[Token] = []
-        self.duchy_capital_building: Token = None
-        self.special_building: CWBuilding = None
-        self.special_building_slot: CWBuilding = None
-        # Title
-        self.holder: Token = None
-        self.de_jure_liege: CWTitle = None
-        self.government: Token = None
-        self.effect: CWObject = None
-        self.name: Token = None
-        self.liege: CWTitle = None
-        self.change_development_level: Token = None
-        self.insert_title_history: Token = None
-        self.reset_name: Token = None
-        self.succession_laws: CWObject = None
-        self.holder_ignore_head_of_faith_requirement: Token = None
-        self.remove_succession_laws: Token = None
+        self.names: tuple[str] = ()
+        self.values: tuple = ()
+
+    def __getattr__(self, name: str):
+        # only called for names that are not slots
+        if name in CWHistoryDate.FIELDS:
+            return self.get(name)
+        raise AttributeError(name)
+
+    def get(self, field: str):
+        if field in self.names:
+            return self.values[self.names.index(field)]
+        return None
 
     def __repr__(self):
         return self.date.token
 
     def __gt__(self, other):
-        if type(other) == type(self):
+        if type(other) is CWHistoryDate:
             return self.datenum > other.datenum
-        else:
-            return self.datenum > other
+        return self.datenum > other
 
     def __ge__(self, other):
-        if type(other) == type(self):
+        if type(other) is CWHistoryDate:
             return self.datenum >= other.datenum
-        else:
-            return self.datenum >= other
+        return self.datenum >= other
 
     def __lt__(self, other):
-        if type(other) == type(self):
+        if type(other) is CWHistoryDate:
             return self.datenum < other.datenum
-        else:
-            return self.datenum < other
+        return self.datenum < other
 
     def __le__(self, other):
-        if type(other) == type(self):
+        if type(other) is CWHistoryDate:
             return self.datenum <= other.datenum
-        else:
-            return self.datenum <= other
+        return self.datenum <= other
 
     @classmethod
     def handle_object(
@@ -984,82 +1192,123 @@ class CWHistoryDate:
         cwitem.datenum = 10000 * splitdate[0] + \
             100 * splitdate[1] + splitdate[2]
 
+        fields = {}
         # Generic
-        cwitem.effect = cwobject.get("effect", allow_multiple=True)
+        fields["effect"] = cwobject.get("effect", allow_multiple=True)
 
         # Province
-        cwitem.culture = cwobject.get("culture", allow_multiple=True)
-        if type(cwitem.culture) is list:
-            cwitem.culture = CWCulture.ALL[cwitem.culture[-1].values.token]
+        fields["culture"] = cwobject.get("culture", allow_multiple=True)
+        if type(fields["culture"]) is list:
+            fields["culture"] = CWCulture.ALL[fields["culture"][-1].values.token]
 
-        cwitem.religion = cwobject.get("religion", allow_multiple=True)
-        if type(cwitem.religion) is list:
-            cwitem.religion = CWFaith.ALL[cwitem.religion[-1].values.token]
+        fields["religion"] = cwobject.get("religion", allow_multiple=True)
+        if type(fields["religion"]) is list:
+            fields["religion"] = CWFaith.ALL[fields["religion"][-1].values.token]
 
-        cwitem.terrain = cwobject.get("terrain", allow_multiple=True)
-        if type(cwitem.terrain) is list:
-            cwitem.terrain = cwitem.terrain[-1].values.token
+        fields["terrain"] = cwobject.get("terrain", allow_multiple=True)
+        if type(fields["terrain"]) is list:
+            fields["terrain"] = fields["terrain"][-1].values.token
 
-        cwitem.holding = cwobject.get("holding", allow_multiple=True)
-        if type(cwitem.holding) is list:
-            cwitem.holding = cwitem.holding[-1].values.token
+        fields["holding"] = cwobject.get("holding", allow_multiple=True)
+        if type(fields["holding"]) is list:
+            fields["holding"] = fields["holding"][-1].values.token
 
-        cwitem.buildings = cwobject.get("buildings", allow_multiple=True)
-        if type(cwitem.buildings) is list:
-            cwitem.buildings = cwitem.buildings[-1].values[0]
+        fields["buildings"] = cwobject.get("buildings", allow_multiple=True)
+        if type(fields["buildings"]) is list:
+            fields["buildings"] = fields["buildings"][-1].values[0]
 
-        cwitem.duchy_capital_building = cwobject.get(
+        fields["duchy_capital_building"] = cwobject.get(
             "duchy_capital_building", allow_multiple=True
         )
-        if type(cwitem.duchy_capital_building) is list:
-            cwitem.duchy_capital_building = cwitem.duchy_capital_building[
+        if type(fields["duchy_capital_building"]) is list:
+            fields["duchy_capital_building"] = fields["duchy_capital_building"][
                 -1
             ].values.token
 
-        cwitem.special_building = cwobject.get(
+        fields["special_building"] = cwobject.get(
             "special_building", allow_multiple=True)
-        if type(cwitem.special_building) is list:
-            cwitem.special_building = CWBuilding.ALL[
-                cwitem.special_building[-1].values.token
+        if type(fields["special_building"]) is list:
+            fields["special_building"] = CWBuilding.ALL[
+                fields["special_building"][-1].values.token
             ]
 
-        cwitem.special_building_slot = cwobject.get(
+        fields["special_building_slot"] = cwobject.get(
             "special_building_slot", allow_multiple=True
         )
-        if type(cwitem.special_building_slot) is list:
-            cwitem.special_building_slot = CWBuilding.ALL[
-                cwitem.special_building_slot[-1].values.token
+        if type(fields["special_building_slot"]) is list:
+            fields["special_building_slot"] = CWBuilding.ALL[
+                fields["special_building_slot"][-1].values.token
             ]
 
         # Title
-        cwitem.holder = cwobject.get("holder")
-        cwitem.de_jure_liege = cwobject.get("de_jure_liege")
-        if cwitem.de_jure_liege is not None:
+        fields["holder"] = cwobject.get("holder")
+        fields["de_jure_liege"] = cwobject.get("de_jure_liege")
+        if fields["de_jure_liege"] is not None:
             # de_jure_liege = 0
-            if cwitem.de_jure_liege.type in (Token.IDENTIFIER, Token.STRING):
-                cwitem.de_jure_liege = CWTitle.ALL[cwitem.de_jure_liege.token]
-
-        cwitem.government = cwobject.get("government")
-        cwitem.effect = cwobject.get("effect", allow_multiple=True)
-        cwitem.name = cwobject.get("name")
-        cwitem.liege = cwobject.get("liege")
-        cwitem.change_development_level = cwobject.get(
+            if fields["de_jure_liege"].type in (Token.IDENTIFIER, Token.STRING):
+                fields["de_jure_liege"] = CWTitle.ALL[fields["de_jure_liege"].token]
+
+        fields["government"] = cwobject.get("government")
+        fields["name"] = cwobject.get("name")
+        fields["liege"] = cwobject.get("liege")
+        fields["change_development_level"] = cwobject.get(
             "change_development_level")
-        cwitem.insert_title_history = cwobject.get("insert_title_history")
-        cwitem.reset_name = cwobject.get("reset_name")
-        cwitem.succession_laws = cwobject.get("succession_laws")
-        cwitem.holder_ignore_head_of_faith_requirement = cwobject.get(
+        fields["insert_title_history"] = cwobject.get("insert_title_history")
+        fields["reset_name"] = cwobject.get("reset_name")
+        fields["succession_laws"] = cwobject.get("succession_laws")
+        fields["holder_ignore_head_of_faith_requirement"] = cwobject.get(
             "holder_ignore_head_of_faith_requirement"
         )
-        cwitem.remove_succession_laws = cwobject.get("remove_succession_laws")
+        fields["remove_succession_laws"] = cwobject.get("remove_succession_laws")
 
+        # sparse, see FIELDS
+        fields = {name: value for name, value in fields.items() if value is not None}
+        names = tuple(fields)
+        cwitem.names = CWHistoryDate.NAMES.setdefault(names, names)
+        cwitem.values = tuple(fields.values())
         return cwitem
 
 
+class CWTimeline:
+    # The dates of a history that set a field, in the order they apply:
+    # by datenum, then as defined, so on the same datenum later defined dates
+    # (and mapped dates, added after the province dates) win
+    # Built once per field, at is a bisect instead of a loop over the dates
+
+    def __init__(self, dates: list[CWHistoryDate] = (), match=None):
+        # match(date) is True when the date sets the field
+        entries = sorted(
+            (date.datenum, position, date)
+            for position, date in enumerate(dates)
+            if match(date)
+        )
+        self.datenums: list[int] = [entry[0] for entry in entries]
+        self.dates: list[CWHistoryDate] = [entry[2] for entry in entries]
+
+    def __repr__(self):
+        return f"CWTimeline({self.dates})"
+
+    def __len__(self):
+        return len(self.dates)
+
+    def at(self, datenum: int, base: CWHistoryDate = None) -> CWHistoryDate:
+        # last date up to datenum, None when there is none or it is before base
+        index = bisect.bisect_right(self.datenums, datenum)
+        if index == 0:
+            return None
+        date = self.dates[index - 1]
+        if base is not None and date < base:
+            return None
+        return date
+
+
 class CWHistoryProvince(CWItem):
     PATH = CWItem.PATH.joinpath("history/provinces")
     ALL: dict[int, "CWHistoryProvince"] = {}
+    DEPENDS = (CWTitle, CWBuilding, CWCulture, CWReligion)
+    PROJECTION = CWHistoryDate.HISTORY
     INDEX = 0
+    SNAPSHOT = ("ALL", "INDEX")
 
     def __init__(self):
         # First load provinces (low index = lower priority)
@@ -1069,20 +1318,37 @@ class CWHistoryProvince(CWItem):
         self.index = CWHistoryProvince.INDEX  # matches define order, not number
         self.name: int = None
         self.barony: CWTitle = None
+        # mapped provinces share dates (and timelines) with their source, never
+        # change the list in place, assign a new one
         self.dates: list[CWHistoryDate] = []
+        self.timelines: dict[str, CWTimeline] = {}
+        self.from_map: bool = False  # data copied has higher priority
         CWHistoryProvince.INDEX += 1
 
     def __repr__(self):
         return str(self.name)
 
+    def timeline(self, name: str, match=None) -> CWTimeline:
+        # dates setting the field name, or matching match, built once
+        if self.timelines is None:
+            self.timelines = {}  # not kept by CWSnapshot
+        timeline = self.timelines.get(name)
+        if timeline is None:
+            if match is None:
+                match = lambda date: date.get(name) is not None
+            timeline = self.timelines[name] = CWTimeline(self.dates, match)
+        return timeline
+
     @classmethod
     def after_load(cls):
         PATH = CWItem.PATH.joinpath("history/province_mapping")
-        files = PATH.glob("*.txt")
-        for file in files:
+        files = sorted(PATH.glob("*.txt"))
+        parsed = parse_files(
+            files, cache=cls.PARSE_CACHE, executor=cls.executor(len(files))
+        )
+        for file, cwobjects in parsed:
             print(f"<{cls.__name__}> Reading: {file.relative_to(BASEPATH)}")
-            tokens = tokenize(read_file(file), file)
-            cwobjects = parse_group(tokens)
+            CWItem.FILES.append(file)
             for cwobject in cwobjects:
                 if cwobject.token.type != Token.NUMBER:
                     cls.error("invalid mapping token type")
@@ -1100,10 +1366,11 @@ class CWHistoryProvince(CWItem):
                     cls.ALL[cwitem.name] = cwitem
 
                 cwitem.barony = CWTitle.PROVINCES[cwobject.token.token]
-                for date in cls.ALL[cwobject.values.token].dates:
-                    newdate = copy.copy(date)
-                    newdate.from_map = True
-                    cwitem.dates.append(newdate)
+                # a view of the source dates, they are not copied
+                source = cls.ALL[cwobject.values.token]
+                cwitem.dates = source.dates
+                cwitem.timelines = source.timelines
+                cwitem.from_map = True
 
     @classmethod
     def handle_object(cls, cwobject: CWObject):
@@ -1119,7 +1386,7 @@ class CWHistoryProvince(CWItem):
 
         cwitem.barony = CWTitle.PROVINCES[cwobject.token.token]
 
-        newdate = CWHistoryDate.handle_object(cwobject, Token("1.1.1"))
+        newdate = CWHistoryDate.handle_object(cwobject, shared_token("1.1.1"))
         newdate.index = cwitem.index
         cwitem.dates.append(newdate)
 
@@ -1127,7 +1394,7 @@ class CWHistoryProvince(CWItem):
             if value.token.type not in (Token.NUMBER, Token.DATE):
                 continue
             elif value.token.type == Token.NUMBER:
-                value.token.transform_into_date()
+                cwobject.transform_key_into_date(value)
             newdate = CWHistoryDate.handle_object(value)
             newdate.index = cwitem.index
             cwitem.dates.append(newdate)
@@ -1135,7 +1402,9 @@ class CWHistoryProvince(CWItem):
         if cwitem.name in cls.ALL:
             # duplicates can exist ( province 4345 )
             # add to existing one
-            cls.ALL[cwitem.name].dates += cwitem.dates
+            duplicate = cls.ALL[cwitem.name]
+            duplicate.dates = duplicate.dates + cwitem.dates
+            duplicate.timelines = {}
             return
         cls.ALL[cwitem.name] = cwitem
 
@@ -1143,12 +1412,26 @@ class CWHistoryProvince(CWItem):
 class CWHistoryTitle(CWItem):
     PATH = CWItem.PATH.joinpath("history/titles")
     ALL: dict[str, "CWHistoryTitle"] = {}
+    DEPENDS = (CWTitle, CWBuilding, CWCulture, CWReligion)
+    PROJECTION = CWHistoryDate.HISTORY
 
     def __init__(self):
         self.raw: CWObject = None
         self.name: str = None
         self.title: CWTitle = None
         self.dates: list[CWHistoryDate] = []
+        self.timelines: dict[str, CWTimeline] = {}
+
+    def timeline(self, name: str, match=None) -> CWTimeline:
+        # dates setting the field name, or matching match, built once
+        if self.timelines is None:
+            self.timelines = {}  # not kept by CWSnapshot
+        timeline = self.timelines.get(name)
+        if timeline is None:
+            if match is None:
+                match = lambda date: date.get(name) is not None
+            timeline = self.timelines[name] = CWTimeline(self.dates, match)
+        return timeline
 
     @classmethod
     def handle_object(cls, cwobject: CWObject):
@@ -1170,16 +1453,122 @@ class CWHistoryTitle(CWItem):
             cwitem.title = CWTitle.ALL[cwobject.token.token]
 
         cwitem.dates.append(
-            CWHistoryDate.handle_object(cwobject, Token("1.1.1")))
+            CWHistoryDate.handle_object(cwobject, shared_token("1.1.1")))
 
         for value in cwobject.values:
             if value.token.type not in (Token.NUMBER, Token.DATE):
                 continue
             elif value.token.type == Token.NUMBER:
-                value.token.transform_into_date()
+                cwobject.transform_key_into_date(value)
             cwitem.dates.append(CWHistoryDate.handle_object(value))
 
 
+class CWHistoryState:
+    # Values of history fields at any date, for every title at once
+    # Each date setting a field is a row of arrays: entity (the title, a
+    # province is its barony), datenum, field and value (index in values,
+    # 0 is no value). Rows of a (field, entity) group are in CWTimeline order,
+    # the value at a date is the last row of its group up to it, found for
+    # every group with one searchsorted
+    # Needs numpy
+    # field -> read from province history, else title history
+    FIELDS = {
+        "culture": True,
+        "religion": True,
+        "special_building": True,
+        "special_building_slot": True,
+        "de_jure_liege": False,
+        "change_development_level": False,
+        "holder": False,
+    }
+    DATE_BITS = 32  # row key = group << DATE_BITS | datenum
+
+    def __init__(self):
+        if numpy is None:
+            raise Exception("CWHistoryState needs numpy")
+        self.entities: list[str] = []  # title names
+        self.ids: dict[str, int] = {}
+        # Tokens are kept as their value, 0 for de_jure_liege = 0
+        self.values: list = [None]
+        values: dict[any, int] = {}
+        self.fields: dict[str, range] = {}  # field -> its groups
+        group_entity, group_start = [], []
+        entity, datenum, field, value = [], [], [], []
+        for number, (name, province) in enumerate(CWHistoryState.FIELDS.items()):
+            start = len(group_start)
+            if province:
+                histories = CWHistoryProvince.ALL.values()
+            else:
+                histories = CWHistoryTitle.ALL.values()
+            for history in histories:
+                timeline = history.timeline(name)
+                if len(timeline) == 0:
+                    continue
+                title = history.barony.name if province else history.name
+                if title not in self.ids:
+                    self.ids[title] = len(self.entities)
+                    self.entities.append(title)
+                group_entity.append(self.ids[title])
+                group_start.append(len(datenum))
+                for date in timeline.dates:
+                    item = date.get(name)
+                    if type(item) is Token:
+                        item = item.token
+                    if item not in values:
+                        values[item] = len(self.values)
+                        self.values.append(item)
+                    entity.append(self.ids[title])
+                    datenum.append(date.datenum)
+                    field.append(number)
+                    value.append(values[item])
+            self.fields[name] = range(start, len(group_start))
+        self.entity = numpy.array(entity, dtype=numpy.int32)
+        self.datenum = numpy.array(datenum, dtype=numpy.int64)
+        self.field = numpy.array(field, dtype=numpy.int8)
+        self.value = numpy.array(value, dtype=numpy.int32)
+        self.group_entity = numpy.array(group_entity, dtype=numpy.int32)
+        self.group_start = numpy.array(group_start, dtype=numpy.int64)
+        # group of each row, rows are in group order so keys are sorted
+        groups = numpy.repeat(
+            numpy.arange(len(group_start), dtype=numpy.int64),
+            numpy.diff(numpy.append(self.group_start, len(datenum))),
+        )
+        self.keys = groups << CWHistoryState.DATE_BITS | self.datenum
+
+    def __repr__(self):
+        return (
+            f"CWHistoryState({len(self.entities)} titles, "
+            f"{len(self.datenum)} dates, {len(self.values)} values)"
+        )
+
+    def at(self, field: str, datenums) -> "numpy.ndarray":
+        # value ids of field for every entity at a datenum, (entities,)
+        # or for a list of datenums, (datenums, entities)
+        groups = numpy.arange(
+            self.fields[field].start, self.fields[field].stop, dtype=numpy.int64
+        )
+        dates = numpy.asarray(datenums, dtype=numpy.int64)
+        queries = groups << CWHistoryState.DATE_BITS | dates[..., numpy.newaxis]
+        rows = numpy.searchsorted(self.keys, queries, side="right") - 1
+        # a row of an earlier group, nothing set up to the date
+        found = rows >= self.group_start[groups]
+        result = numpy.zeros(dates.shape + (len(self.entities),), dtype=numpy.int32)
+        result[..., self.group_entity[groups]] = numpy.where(
+            found, self.value[rows], 0
+        )
+        return result
+
+    def values_at(self, field: str, datenum: int) -> dict[str, any]:
+        # title name -> value of field at a datenum, titles with a value
+        result = self.at(field, datenum)
+        return {
+            self.entities[entity]: self.values[value]
+            for entity, value in zip(
+                numpy.flatnonzero(result).tolist(), result[result != 0].tolist()
+            )
+        }
+
+
 class CWCulturalNames(CWItem):
     PATH_LOC = [
         BASEPATH.joinpath(
@@ -1188,42 +1577,364 @@ class CWCulturalNames(CWItem):
         BASEPATH.joinpath(
             "localization/english/titles_cultural_names_l_english.yml"),
     ]
-
-    @classmethod
-    def load_files(cls):
-        cls.load_localization()
+    LOC_INDEX = True
 
 
 class CWDynastyNames(CWItem):
     PATH_LOC = BASEPATH.joinpath("localization/english/dynasties")
-
-    @classmethod
-    def load_files(cls):
-        cls.load_localization()
+    LOC_INDEX = True
 
 
 class CWDLCLocs(CWItem):
     PATH_LOC = BASEPATH.joinpath("localization/english/dlc").glob("**/*.yml")
+    LOC_INDEX = True
+
+
+class CWSnapshot:
+    # Every CWItem registry, CWLoc.ALL and the registries of the extra
+    # classes (with serialize and deserialize) in one file, to start
+    # without loading the game files again
+    # Objects are stored once in a table and referenced by their index, so
+    # are the lists in their fields, which several objects can share
+    # (CWHistoryProvince.dates)
+    # CWObject trees are stored as values, raw and timelines are not kept
+    # Only loaded while the files read by load_items, and their
+    # directories, are unchanged, and so are the modules that load them
+    # (sources) and the constants they use
+    VERSION = 4
+    LIST = "list"  # table entries of lists
+    SKIP = frozenset(("raw", "timelines"))
+    SOURCES = [
+        pathlib.Path(__file__),
+        pathlib.Path(sys.modules[Token.__module__].__file__),
+    ]
 
-    @classmethod
-    def load_files(cls):
-        cls.load_localization()
+    def __init__(
+        self,
+        extra: list[type] = (),
+        sources: list[pathlib.Path | str] = (),
+        constants: tuple = (),
+    ):
+        # sources and constants of the caller, ex: ck3wiki.py and STARTING_DATES
+        self.sources = CWSnapshot.SOURCES + [pathlib.Path(source) for source in sources]
+        self.constants = repr(constants)
+        classes = [CWItem]
+        for cls in classes:
+            classes += cls.__subclasses__()
+        self.classes = classes[1:] + list(extra)
+        self.types = {
+            cls.__name__: cls
+            for cls in [*self.classes, CWHistoryDate, CWCondition, CWLoc]
+        }
+        self.registries: dict[str, any] = {}
+        self.table: list = []
+        self.ids: dict[int, int] = {}  # id(object) -> index in table
+        self.pending: list = []
+
+    def __repr__(self):
+        return (
+            f"CWSnapshot({len(self.registries)} registries, "
+            f"{len(self.table)} objects)"
+        )
+
+    def stamp(self) -> tuple:
+        sources = tuple(
+            hashlib.blake2b(source.read_bytes(), digest_size=16).digest()
+            for source in self.sources
+        )
+        return (
+            CWSnapshot.VERSION,
+            marshal.version,
+            tuple(sorted(self.types)),
+            sources,
+            self.constants,
+        )
+
+    @staticmethod
+    def fields(value) -> dict[str, any]:
+        # __dict__, or the slots of classes with __slots__ (CWHistoryDate)
+        if hasattr(value, "__dict__"):
+            return value.__dict__
+        return {name: getattr(value, name) for name in type(value).__slots__}
+
+    def store(self, cls: type, names: Iterable[str]):
+        for name in names:
+            self.registries[f"{cls.__name__}.{name}"] = self.encode(getattr(cls, name))
+
+    def restore(self, cls: type, names: Iterable[str]):
+        for name in names:
+            value = self.decode(self.registries[f"{cls.__name__}.{name}"])
+            current = getattr(cls, name)
+            if isinstance(current, dict):  # others may hold the registry
+                current.clear()
+                current.update(value)
+            else:
+                setattr(cls, name, value)
+
+    def encode(self, value):
+        # marshal friendly values, tagged tuples for everything else
+        if value is None or type(value) in (str, int, float, bool):
+            return value
+        if type(value) is list:
+            return [self.encode(item) for item in value]
+        if type(value) is tuple:
+            return ("tuple", [self.encode(item) for item in value])
+        if isinstance(value, dict):
+            return (
+                "dict",
+                [self.encode(key) for key in value],
+                [self.encode(item) for item in dict.values(value)],  # CWLocStore
+            )
+        if isinstance(value, SharedToken):
+            return ("shared", str(value.token))
+        if isinstance(value, Token):
+            return ("token", value.type, value.token)
+        if isinstance(value, CWObject):
+            return (
+                "cwobject",
+                self.encode(value.token),
+                self.encode(value.operator),
+                self.encode(value.values),
+            )
+        if isinstance(value, pathlib.Path):
+            return ("path", str(value))
+        if type(value).__name__ not in self.types:
+            raise Exception(f"Can not snapshot {type(value)}: {value}")
+        return self.reference(value)
+
+    def reference(self, value) -> tuple:
+        # fields are encoded later, so reference cycles end here
+        index = self.ids.get(id(value))
+        if index is None:
+            index = self.ids[id(value)] = len(self.table)
+            self.table.append(None)
+            self.pending.append(value)
+        return ("ref", index)
+
+    def field(self, value):
+        # lists in fields are references, other objects may hold the same list
+        if type(value) is list:
+            return self.reference(value)
+        return self.encode(value)
+
+    def decode(self, value):
+        if value is None or type(value) in (str, int, float, bool):
+            return value
+        if type(value) is list:
+            return [self.decode(item) for item in value]
+        tag = value[0]
+        if tag == "ref":
+            return self.table[value[1]]
+        if tag == "tuple":
+            return tuple(self.decode(item) for item in value[1])
+        if tag == "dict":
+            return dict(
+                zip(
+                    [self.decode(key) for key in value[1]],
+                    [self.decode(item) for item in value[2]],
+                )
+            )
+        if tag == "shared":
+            return shared_token(value[1])
+        if tag == "token":
+            token = Token.__new__(Token)
+            token.type, token.token = value[1], value[2]
+            token.filename, token.offset, token.end = None, -1, -1
+            token.line_index = None
+            return token
+        if tag == "cwobject":
+            cwobject = CWObject(self.decode(value[1]), self.decode(value[2]))
+            cwobject.values = self.decode(value[3])
+            return cwobject
+        if tag == "path":
+            return pathlib.Path(value[1])
+        raise Exception(f"Unknown snapshot value: {tag}")
+
+    def save(self, path: pathlib.Path):
+        self.registries, self.table, self.ids, self.pending = {}, [], {}, []
+        for cls in self.classes:
+            cls.serialize(self)
+        # names -> ids, the values of the default language, other languages
+        # are read again from the sources
+        self.store(CWLoc, ("ALL",))
+        self.registries["CWLoc.ALL.values"] = self.encode(
+            CWLoc.ALL.languages[CWLocStore.LANGUAGE].values
+        )
+        self.registries["CWLoc.ALL.indexes"] = [
+            index.dump() for index in CWLoc.ALL.indexes
+        ]
+        self.registries["CWLoc.ALL.sources"] = CWLoc.ALL.sources
+        self.store(CWItem, ("FILES",))
+        while self.pending:
+            value = self.pending.pop()
+            if type(value) is list:
+                entry = (CWSnapshot.LIST, [self.encode(item) for item in value])
+            else:
+                entry = (
+                    type(value).__name__,
+                    {
+                        name: None if name in CWSnapshot.SKIP else self.field(field)
+                        for name, field in CWSnapshot.fields(value).items()
+                    },
+                )
+            self.table[self.ids[id(value)]] = entry
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + ".tmp")
+        # directories change when files are added or removed
+        files = CWItem.FILES + sorted({file.parent for file in CWItem.FILES})
+        header = marshal.dumps((self.stamp(), fingerprint_files(files)))
+        with temporary.open("wb") as f:
+            # marshal.load reads files in tiny pieces, loads is much faster
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            f.write(marshal.dumps((self.registries, self.table)))
+        os.replace(temporary, path)
+        self.ids, self.pending = {}, []
+
+    def load(self, path: pathlib.Path) -> bool:
+        # False when there is no snapshot or it is out of date
+        try:
+            data = memoryview(path.read_bytes())
+            size = int.from_bytes(data[:8], "little")
+            stamp, fingerprint = marshal.loads(data[8 : 8 + size])
+            if stamp != self.stamp():
+                return False
+            files = [pathlib.Path(file[0]) for file in fingerprint]
+            if fingerprint_files(files) != fingerprint:
+                return False
+            self.registries, table = marshal.loads(data[8 + size :])
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        # objects first, their fields can reference each other
+        self.table = []
+        for name, _ in table:
+            if name == CWSnapshot.LIST:
+                self.table.append([])
+            else:
+                self.table.append(self.types[name].__new__(self.types[name]))
+        for cwitem, (_, fields) in zip(self.table, table):
+            if type(cwitem) is list:
+                cwitem.extend([self.decode(item) for item in fields])
+            elif hasattr(cwitem, "__dict__"):
+                cwitem.__dict__.update(
+                    {name: self.decode(field) for name, field in fields.items()}
+                )
+            else:
+                for name, field in fields.items():
+                    setattr(cwitem, name, self.decode(field))
+        for cls in self.classes:
+            cls.deserialize(self)
+        self.restore(CWLoc, ("ALL",))
+        CWLoc.ALL.languages[CWLocStore.LANGUAGE].values = self.decode(
+            self.registries["CWLoc.ALL.values"]
+        )
+        for index in self.registries["CWLoc.ALL.indexes"]:
+            CWLoc.ALL.indexes.append(CWLocIndex.load(index))
+        CWLoc.ALL.sources = self.registries["CWLoc.ALL.sources"]
+        self.restore(CWItem, ("FILES",))
+        return True
+
+
+class CWScheduler:
+    # load_files of each item once the items it DEPENDS on are loaded
+    # Reading does not depend on other items, so while one item loads the
+    # files of the next AHEAD items are read (tokenized by the CWItem executor
+    # when there is one) and their localization files read by threads
+    # Only reading overlaps, loading runs one item at a time: registries are
+    # not locked and CWLoc, CWObject numbering and duplicates depend on the
+    # order, which is the order of the list wherever dependencies allow it
+    READERS = 4  # threads reading localization files
+    AHEAD = 2  # items read ahead of the one loading
+
+    def __init__(self, items: list[type[CWItem]]):
+        self.order = self.sort(items)
+        self.timings: dict[type[CWItem], float] = {}
+
+    def __repr__(self):
+        return f"CWScheduler({[item.__name__ for item in self.order]})"
+
+    @staticmethod
+    def sort(items: list[type[CWItem]]) -> list[type[CWItem]]:
+        # Items outside the list are taken as already loaded
+        order = []
+        pending = list(items)
+        while pending:
+            for item in pending:
+                if all(d in order or d not in items for d in item.DEPENDS):
+                    break
+            else:
+                raise Exception(f"<CWScheduler> Dependency cycle: {pending}")
+            order.append(item)
+            pending.remove(item)
+        return order
+
+    def run(self):
+        with concurrent.futures.ThreadPoolExecutor(CWScheduler.READERS) as readers:
+            order = iter(self.order)
+            reads = collections.deque()
+            while True:
+                while len(reads) <= CWScheduler.AHEAD:
+                    item = next(order, None)
+                    if item is None:
+                        break
+                    reads.append(
+                        (item, item.read_files(), item.read_localization(readers))
+                    )
+                if not reads:
+                    break
+                item, parsed, localization = reads.popleft()
+                start = time.perf_counter()
+                item.load_files(parsed, localization)
+                self.timings[item] = time.perf_counter() - start
+
+    def critical_path(self) -> tuple[float, list[type[CWItem]]]:
+        # Longest chain of load times through the dependencies, the least
+        # time loading could take if independent items ran side by side
+        paths = {}
+        for item in self.order:
+            before = max(
+                (paths[depend] for depend in item.DEPENDS if depend in paths),
+                default=(0, []),
+                key=lambda path: path[0],
+            )
+            paths[item] = (before[0] + self.timings[item], before[1] + [item])
+        return max(paths.values(), key=lambda path: path[0], default=(0, []))
+
+    def report(self):
+        total, path = self.critical_path()
+        chain = " > ".join(
+            f"{item.__name__} {self.timings[item]:.2f}s" for item in path
+        )
+        print(
+            f"<CWScheduler> Critical path {total:.2f}s of "
+            f"{sum(self.timings.values()):.2f}s: {chain}"
+        )
+
+
+LOAD_ORDER = [
+    CWColor,
+    CWTitle,
+    CWBuilding,
+    CWTradition,
+    CWCulture,
+    CWHolySite,
+    CWReligionFamily,
+    CWReligion,
+    CWHistoryProvince,
+    CWHistoryTitle,
+    CWCulturalNames,
+    CWDynastyNames,
+    CWDLCLocs,
+]
 
 
 def load_items():
-    CWColor.load_files()
-    CWTitle.load_files()
-    CWBuilding.load_files()
-    CWTradition.load_files()
-    CWCulture.load_files()
-    CWHolySite.load_files()
-    CWReligionFamily.load_files()
-    CWReligion.load_files()
-    CWHistoryProvince.load_files()
-    CWHistoryTitle.load_files()
-    CWCulturalNames.load_files()
-    CWDynastyNames.load_files()
-    CWDLCLocs.load_files()
+    scheduler = CWScheduler(LOAD_ORDER)
+    try:
+        scheduler.run()
+    finally:
+        CWItem.shutdown_executor()
+    scheduler.report()
 
 
 pass